@@ -1,14 +1,11 @@
 from api.link import *
 
-from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import ORJSONResponse
 
 from pyldapi import Renderer
 from api.profiles import *
 from config import *
-
-
-templates = Jinja2Templates(directory="templates")
+from utils.templates import templates
 
 
 class ApiDescRenderer(Renderer):
@@ -175,7 +172,7 @@ class ApiDescRenderer(Renderer):
             "paths": self.paths,
         }
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.OPEN_API_3.value),
             headers=self.headers,
@@ -1,19 +1,21 @@
 import json
-from typing import List
+from typing import List, Optional
 
 from fastapi import Response
-from fastapi.responses import JSONResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from geomet import wkt
 from rdflib import URIRef, Literal, Graph
-from rdflib.namespace import DCTERMS, RDF, DCAT, RDFS
+from rdflib.namespace import DCTERMS, RDF, DCAT, RDFS, XSD
 from pyldapi import Renderer
 
 from api.link import *
 from api.profiles import *
 from config import *
-
-templates = Jinja2Templates(directory="templates")
+from utils.labels import add_labels
+from utils.rows import PropertyRow, add_prefixes
+from utils.sparql_queries import collection_uri_sparql
+from utils.templates import templates
+from utils.utils import result_value
 
 
 class Collection(object):
@@ -24,9 +26,6 @@ class Collection(object):
     ):
         self.uri = uri
 
-        # get graph namespaces to use for prefixes
-        self.graph_namespaces = g.query(f"""DESCRIBE <{self.uri}>""", initNs=prefixes).graph
-
         # sparql query to get props
         non_bnode_query = g.query(
             f"""
@@ -35,16 +34,12 @@ class Collection(object):
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#> 
             PREFIX geo: <http://www.opengis.net/ont/geosparql#>
             PREFIX ogcldapi: <https://data.surroundaustralia.com/def/ogcldapi/>
-            SELECT ?p1 ?p1Label ?o1 ?o1Label ?system_url {{
+            SELECT ?p1 ?o1 ?system_url {{
                 <{self.uri}> ?p1 ?o1
                 VALUES (?feature ?fc) {{(geo:Feature ogcldapi:FeatureCollection)}}
                 OPTIONAL {{?o1 a ?fc ;
                                dcterms:identifier ?feature_collection .
                            BIND(CONCAT("{LANDING_PAGE_URL}/collections/", ?feature_collection) AS ?system_url)}}
-                OPTIONAL {{ 
-                    {{?p1 rdfs:label ?p1Label}} FILTER(lang(?p1Label) = "" || lang(?p1Label) = "en") }}
-                OPTIONAL {{ 
-                    {{?o1 rdfs:label ?o1Label}} FILTER(lang(?o1Label) = "" || lang(?o1Label) = "en") }}
                 FILTER(!ISBLANK(?o1))
                 MINUS {{ <{self.uri}> a ?o1 .
                   MINUS {{ <{self.uri}> a ?o1 .
@@ -52,26 +47,18 @@ class Collection(object):
                 }}
                 }}"""
         )
-        non_bnode_results = [
-            {str(k): v for k, v in i.items()} for i in non_bnode_query.bindings
-        ]
+        non_bnode_results = PropertyRow.from_result(non_bnode_query)
+        add_labels((non_bnode_results, ["p1", "o1"]))
 
         # add prefixed URIs (e.g. "skos:prefLabel") to the properties (for display as tooltips in the UI)
-        for result_set in [non_bnode_results]:
-            for property in result_set:
-                for k, v in property.copy().items():
-                    if isinstance(v, URIRef):
-                        property[f"{k}Prefixed"] = v.n3(
-                            self.graph_namespaces.namespace_manager
-                        )
+        add_prefixes(non_bnode_results)
 
         self.properties = [i for i in non_bnode_results]
 
         # Feature properties
-        collection_graph = g.query(f"""DESCRIBE <{self.uri}>""").graph
-        self.identifier = collection_graph.value(URIRef(self.uri), DCTERMS.identifier)
-        self.title = collection_graph.value(URIRef(self.uri), RDFS.label)
-        self.description = collection_graph.value(URIRef(self.uri), DCTERMS.description)
+        self.identifier = result_value(self.properties, DCTERMS.identifier)
+        self.title = result_value(self.properties, RDFS.label)
+        self.description = result_value(self.properties, DCTERMS.description)
 
         # for p, o in g.predicate_objects(subject=URIRef(self.uri)):
         #     if p == DCTERMS.title:
@@ -99,17 +86,19 @@ class Collection(object):
         # for s in g.subjects(predicate=DCTERMS.isPartOf, object=URIRef(self.uri)):
         #     self.feature_count += 1
 
-    def to_dict(self):
-        self.links = [x.__dict__ for x in self.links]
-
-        # delattr(self, "feature_count")  # this attribute is for internal use only and can be misleading if communicated
-        return self.__dict__
-
-    def to_geo_json_dict(self):
-        self.links = [x.__dict__ for x in self.links]
+    def to_dict(self) -> dict:
+        return {
+            "uri": self.uri,
+            "identifier": self.identifier,
+            "title": self.title,
+            "description": self.description,
+            "extent_spatial": self.extent_spatial,
+            "extent_temporal": self.extent_temporal,
+            "links": [x.to_dict() for x in self.links],
+        }
 
-        # delattr(self, "feature_count")  # this attribute is for internal use only and can be misleading if communicated
-        return self.__dict__
+    def to_geo_json_dict(self) -> dict:
+        return self.to_dict()
 
     def to_geosp_graph(self):
         g = Graph()
@@ -130,9 +119,54 @@ class Collection(object):
         return g
 
 
+# Collections by URI, and Collection URIs by identifier, cached until the data is reloaded
+_collections = {}
+_collection_uris = {}
+
+
+def get_collection(uri: str) -> Collection:
+    """Returns the Collection with a URI, loading it from the store on first use"""
+    collection = _collections.get(str(uri))
+    if collection is None:
+        collection = Collection(str(uri))
+        _collections[str(uri)] = collection
+    return collection
+
+
+def get_collection_uri(collection_id: str) -> Optional[str]:
+    """Returns the URI of the Collection with an identifier, or None if there is no such Collection
+
+    Only the URIs of Collections that exist are kept, so requests for made up identifiers can't fill the memory.
+    """
+    collection_uri = _collection_uris.get(collection_id)
+    if collection_uri is None:
+        for r in g.query(
+            collection_uri_sparql.substitute(
+                {"ID": Literal(collection_id, datatype=XSD.token).n3()}
+            )
+        ):
+            collection_uri = str(r["collection"])
+        if collection_uri is not None:
+            _collection_uris[collection_id] = collection_uri
+    return collection_uri
+
+
+def clear_collections() -> None:
+    _collections.clear()
+    _collection_uris.clear()
+
+
+def forget_collections(collection_ids) -> None:
+    """Drops what is cached for the Collections with some identifiers, e.g. those changed by a reload"""
+    for collection_id in collection_ids:
+        uri = _collection_uris.pop(collection_id, None)
+        if uri is not None:
+            _collections.pop(uri, None)
+
+
 class CollectionRenderer(Renderer):
     def __init__(self, request, collection_uri: str, other_links: List[Link] = None):
-        self.collection = Collection(collection_uri)
+        self.collection = get_collection(collection_uri)
         self.links = [
             Link(
                 LANDING_PAGE_URL + "/collections.json",
@@ -189,11 +223,11 @@ class CollectionRenderer(Renderer):
 
     def _render_oai_json(self):
         page_json = {
-            "links": [x.__dict__ for x in self.links],
+            "links": [x.to_dict() for x in self.links],
             "collection": self.collection.to_dict(),
         }
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.JSON.value),
             headers=self.headers,
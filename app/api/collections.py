@@ -1,16 +1,15 @@
 from typing import List
 
 from fastapi import Response
-from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import ORJSONResponse
 from pyldapi import ContainerRenderer
 
 from api.link import *
 from api.profiles import *
 from config import *
 from utils import utils
+from utils.templates import templates
 
-templates = Jinja2Templates(directory="templates")
 g = utils.g
 
 
@@ -184,11 +183,11 @@ class CollectionsRenderer(ContainerRenderer):
         ]
 
         page_json = {
-            "links": [x.__dict__ for x in self.links],
+            "links": [x.to_dict() for x in self.links],
             "collections": collection_dicts,
         }
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.JSON.value),
             headers=self.headers,
@@ -1,20 +1,58 @@
+from typing import Tuple
+
+import orjson
+
 from fastapi import Response
-from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse
 from pyldapi import Renderer
 
 from api.link import *
 from api.profiles import *
 from config import *
+from utils.cache import BodyCache
+from utils.sparql_queries import conformance_targets_sparql
+from utils.templates import templates
 
 
-templates = Jinja2Templates(directory="templates")
+class ConformanceRegistry:
+    """The conformance classes the API declares, along with their rendered bodies
 
+    A registry is never changed once built, a data reload builds and swaps in a new one. Bodies are rendered on first
+    use and kept for the life of the registry, the HTML page for as many of the base URLs it is asked for on as
+    MAX_BASE_URLS, the least recently asked for dropped.
+    """
 
-class ConformanceRenderer(Renderer):
-    def __init__(self, request, conformance_classes):
+    MAX_BASE_URLS = 16
 
+    def __init__(self, conformance_classes: Tuple[Tuple[str, str], ...]):
         self.conformance_classes = conformance_classes
+        # the JSON body and the HTML page for each base URL, which comes from the request's Host header
+        self.bodies = BodyCache(maxsize=self.MAX_BASE_URLS + 1)
+
+
+registry = ConformanceRegistry(())
+
+
+def load_conformance_classes(g) -> None:
+    """Loads the conformance targets from the store, with a single query, into a new registry"""
+    global registry
+
+    titles = {}
+    for r in g.query(conformance_targets_sparql):
+        uri = str(r["uri"])
+        if titles.get(uri) is None:
+            titles[uri] = str(r["title"]) if r["title"] is not None else None
+    registry = ConformanceRegistry(
+        tuple((uri, title if title is not None else uri) for uri, title in sorted(titles.items()))
+    )
+
+
+class ConformanceRenderer(Renderer):
+    def __init__(self, request):
+
+        # the registry in use when the request arrived, in case a reload swaps it mid-render
+        self.registry = registry
+        self.conformance_classes = self.registry.conformance_classes
 
         super().__init__(
             request,
@@ -53,10 +91,13 @@ class ConformanceRenderer(Renderer):
                 return self._render_oai_html()
 
     def _render_oai_json(self):
-        page_json = {"conformsTo": self.conformance_classes}
+        body = self.registry.bodies.get(
+            "json",
+            lambda: orjson.dumps({"conformsTo": self.conformance_classes}),
+        )
 
-        return JSONResponse(
-            page_json,
+        return Response(
+            body,
             media_type=str(MediaType.JSON.value),
             headers=self.headers,
         )
@@ -69,6 +110,10 @@ class ConformanceRenderer(Renderer):
             "api_title": f"Conformance - {API_TITLE}"
         }
 
-        return templates.TemplateResponse(
-            name="conformance.html", context=_template_context, headers=self.headers
+        # the page links to static files by absolute URL, so is cached per base URL the API is reached on
+        body = self.registry.bodies.get(
+            ("html", str(self.request.base_url)),
+            lambda: templates.get_template("conformance.html").render(_template_context).encode("utf-8"),
         )
+
+        return HTMLResponse(body, headers=self.headers)
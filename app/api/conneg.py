@@ -0,0 +1,67 @@
+import re
+from typing import Optional
+
+from pyldapi import Renderer
+from pyldapi.exceptions import ProfilesMediatypesException
+
+from api.profiles import *
+from config import *
+
+
+# the profiles offered by each content negotiated endpoint, mirroring those given to the endpoint's Renderer, and the
+# Cache-Control policy for its responses. Data only changes on reload and clients can revalidate cheaply via ETags.
+ROUTES = [
+    (re.compile(r"^/$"), {"oai": profile_openapi, "dcat": profile_dcat}, "oai", f"public, max-age={CACHE_MAX_AGE}"),
+    (re.compile(r"^/collections$"), {"oai": profile_openapi}, "oai", f"public, max-age={CACHE_MAX_AGE}"),
+    (
+        re.compile(r"^/collections/[^/]+$"),
+        {"oai": profile_openapi, "mem": profile_mem},
+        "oai",
+        f"public, max-age={CACHE_MAX_AGE}",
+    ),
+    (
+        re.compile(r"^/collections/[^/]+/items$"),
+        {"oai": profile_openapi, "geosp": profile_geosparql},
+        "oai",
+        f"public, max-age={CACHE_MAX_AGE}",
+    ),
+    (
+        re.compile(r"^/collections/[^/]+/items/[^/]+$"),
+        {"oai": profile_openapi, "geosp": profile_geosparql},
+        "oai",
+        f"public, max-age={CACHE_MAX_AGE}",
+    ),
+    (re.compile(r"^/conformance$"), {"oai": profile_openapi}, "oai", f"public, max-age={CACHE_MAX_AGE * 12}"),
+]
+
+
+def negotiate(request) -> Optional[Renderer]:
+    """Works out the profile & Media Type a request will be answered with, without querying the store
+
+    Returns a bare pyLDAPI Renderer carrying the negotiated profile, mediatype & headers, or None if the request is not
+    for a content negotiated endpoint or the negotiation failed.
+    """
+    path = request.url.path
+    for pattern, profiles, default_profile_token, _ in ROUTES:
+        if pattern.match(path):
+            try:
+                renderer = Renderer(
+                    request,
+                    LANDING_PAGE_URL + path.rstrip("/"),
+                    dict(profiles),
+                    default_profile_token,
+                )
+            except ProfilesMediatypesException:
+                return None
+            if renderer.vf_error is not None:
+                return None
+            return renderer
+    return None
+
+
+def cache_control(path: str) -> Optional[str]:
+    """Returns the Cache-Control policy for responses from an endpoint"""
+    for pattern, _, _, policy in ROUTES:
+        if pattern.match(path):
+            return policy
+    return None
@@ -1,8 +1,8 @@
 from typing import List
 
+import orjson
 from fastapi import Response
-from fastapi.responses import JSONResponse, PlainTextResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from geojson_rewind import rewind
 from geomet import wkt
 from rdflib import Graph
@@ -13,9 +13,12 @@ from pyldapi import Renderer, RDF_MEDIATYPES
 from api.link import *
 from api.profiles import *
 from config import *
+from utils.labels import add_labels
+from utils.rows import BnodePropertyRow, GeometryRow, PropertyRow, add_prefixes
 from utils.sparql_queries import feature_class_label_sparql
+from utils.templates import templates
+from utils.utils import result_value
 
-templates = Jinja2Templates(directory="templates")
 
 class GeometryRole(Enum):
     Boundary = "https://linked.data.gov.au/def/geometry-roles/boundary"
@@ -33,13 +36,32 @@ class CRS(Enum):
 
 
 class Geometry(object):
-    def __init__(self, coordinates: str, role: GeometryRole, label: str, crs: CRS):
-        self.coordinates = coordinates
+    """A geometry literal of a Feature, kept as the literal it was read as and only parsed when a serialiser needs it"""
+
+    __slots__ = ("literal", "role", "label", "crs", "predicate", "prefix", "_geo_json")
+
+    def __init__(
+        self,
+        literal: Literal,
+        role: GeometryRole,
+        label: str,
+        crs: CRS,
+        predicate: URIRef = None,
+        prefix: str = None,
+    ):
+        self.literal = literal
         self.role = role
         self.label = label
         self.crs = crs
+        self.predicate = predicate
+        self.prefix = prefix
+        self._geo_json = None
+
+    @property
+    def coordinates(self) -> str:
+        return self.literal
 
-    def to_dict(self):
+    def to_dict(self) -> dict:
         return {
             "coordinates": self.coordinates,
             "role": self.role.value,
@@ -47,12 +69,24 @@ class Geometry(object):
             "crs": self.crs.value,
         }
 
-    def to_geo_json_dict(self):
+    def to_geo_json_dict(self) -> dict:
         # this only works for WGS84 coordinates, no differentiation on role for now
-        if self.crs == CRS.WGS84:
-            return wkt.loads(self.coordinates)
-        else:
-            return TypeError("Only WGS84 geometries can be serialised in GeoJSON")
+        if self.crs != CRS.WGS84:
+            raise TypeError("Only WGS84 geometries can be serialised in GeoJSON")
+        if self._geo_json is None:
+            if self.predicate == GEO.asGeoJSON:
+                self._geo_json = orjson.loads(str(self.literal))
+            else:
+                self._geo_json = wkt.loads(str(self.literal))
+        return self._geo_json
+
+
+# the geometry literal properties of a Feature's geometry blank nodes, and their CRSs
+GEOMETRY_PREDICATES = {
+    GEO.asWKT: CRS.WGS84,
+    GEO.asGeoJSON: CRS.WGS84,
+    GEOX.asDGGS: CRS.TB16PIX,
+}
 
 
 class Feature(object):
@@ -60,9 +94,6 @@ class Feature(object):
         self.uri = uri
         self.geometries = {}
 
-        # get graph namespaces to use for prefixes
-        self.graph_namespaces = g.query(f"""DESCRIBE <{self.uri}>""", initNs=prefixes).graph
-
         non_bnode_query = g.query(
             f"""
             PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -70,7 +101,7 @@ class Feature(object):
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#> 
             PREFIX geo: <http://www.opengis.net/ont/geosparql#>
             PREFIX ogcldapi: <https://data.surroundaustralia.com/def/ogcldapi/>
-            SELECT ?p1 ?p1Label ?o1 ?o1Label ?system_url {{
+            SELECT ?p1 ?o1 ?system_url {{
                 <{self.uri}> ?p1 ?o1
                 VALUES (?feature ?fc) {{(geo:Feature ogcldapi:FeatureCollection)}}
                 OPTIONAL {{?o1 a ?feature ; 
@@ -78,10 +109,6 @@ class Feature(object):
                                dcterms:isPartOf / dcterms:identifier ?feature_fc_id .
                            BIND(CONCAT("{LANDING_PAGE_URL}/collections/", ?feature_fc_id, "/items/", ?feature_id) AS ?system_url)
                 }}
-                OPTIONAL {{ 
-                    {{?p1 rdfs:label ?p1Label}} FILTER(lang(?p1Label) = "" || lang(?p1Label) = "en") }}
-                OPTIONAL {{ 
-                    {{?o1 rdfs:label ?o1Label}} FILTER(lang(?o1Label) = "" || lang(?o1Label) = "en") }}
                 FILTER(!ISBLANK(?o1))
                 MINUS {{ <{self.uri}> a ?o1 .
                   MINUS {{ <{self.uri}> a ?o1 .
@@ -89,95 +116,71 @@ class Feature(object):
                 }}
                 }}"""
         )
-        non_bnode_results = [
-            {str(k): v for k, v in i.items()} for i in non_bnode_query.bindings
-        ]
+        non_bnode_results = PropertyRow.from_result(non_bnode_query)
 
         bnode_query = g.query(
             f"""
             PREFIX dcterms: <http://purl.org/dc/terms/> 
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#> 
             PREFIX geo: <http://www.opengis.net/ont/geosparql#>
-            SELECT ?p1 ?p1Label ?p2 ?p2Label ?o2 ?o2Label ?o1 {{
+            SELECT ?p1 ?p2 ?o2 ?o1 {{
                 <{self.uri}> ?p1 ?o1 .
                 ?o1 ?p2 ?o2
-                OPTIONAL {{ 
-                    {{?p1 rdfs:label ?p1Label}} FILTER(lang(?p1Label) = "" || lang(?p1Label) = "en") }}
-                OPTIONAL 
-                    {{ {{?p2 rdfs:label ?p2Label}} FILTER(lang(?p2Label) = "" || lang(?p2Label) = "en") }}
-                OPTIONAL {{ 
-                    {{?o2 rdfs:label ?o2Label}} FILTER(lang(?o2Label) = "" || lang(?o2Label) = "en") }}
                 FILTER(ISBLANK(?o1))
                 FILTER(?p1!=geo:hasGeometry)
                 }}"""
         )
-        bnode_results = [
-            {str(k): v for k, v in i.items()} for i in bnode_query.bindings
-        ]
+        bnode_results = BnodePropertyRow.from_result(bnode_query)
 
         geom_query = g.query(
             f"""
             PREFIX dcterms: <http://purl.org/dc/terms/> 
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
             PREFIX geo: <http://www.opengis.net/ont/geosparql#>
-            SELECT ?p1 ?p1Label ?p2 ?p2Label ?o2 ?o2Label {{
+            SELECT ?p1 ?p2 ?o2 {{
                 <{self.uri}> ?p1 ?o1 .
                 ?o1 ?p2 ?o2
-                OPTIONAL {{ 
-                    {{?p1 rdfs:label ?p1Label}} FILTER(lang(?p1Label) = "" || lang(?p1Label) = "en") }}
-                OPTIONAL 
-                    {{ {{?p2 rdfs:label ?p2Label}} FILTER(lang(?p2Label) = "" || lang(?p2Label) = "en") }}
-                OPTIONAL {{ 
-                    {{?o2 rdfs:label ?o2Label}} FILTER(lang(?o2Label) = "" || lang(?o2Label) = "en") }}
                 FILTER(ISBLANK(?o1))
                 FILTER(?p1=geo:hasGeometry)
                 }}"""
         )
-        geom_results = [{str(k): v for k, v in i.items()} for i in geom_query.bindings]
+        geom_results = GeometryRow.from_result(geom_query)
+
+        add_labels((non_bnode_results, ["p1", "o1"]), (bnode_results + geom_results, ["p1", "p2", "o2"]))
 
         # add prefixed URIs (e.g. "skos:prefLabel") to the properties (for display as tooltips in the UI)
-        for result_set in [non_bnode_results, bnode_results, geom_results]:
-            for property in result_set:
-                for k, v in property.copy().items():
-                    if isinstance(v, URIRef):
-                        property[f"{k}Prefixed"] = v.n3(
-                            self.graph_namespaces.namespace_manager
-                        )
+        add_prefixes(non_bnode_results + bnode_results + geom_results)
 
         self.properties = [i for i in non_bnode_results]
 
         self.bnode_properties = bnode_results
 
-        self.identifier = self.graph_namespaces.value(
-            URIRef(self.uri), DCTERMS.identifier
-        )
-        self.title = self.graph_namespaces.value(URIRef(self.uri), RDFS.label)
-        self.description = self.graph_namespaces.value(
-            URIRef(self.uri), DCTERMS.description
-        )
-        self.isPartOf = self.graph_namespaces.value(URIRef(self.uri), DCTERMS.isPartOf)
+        self.identifier = result_value(self.properties, DCTERMS.identifier)
+        self.title = result_value(self.properties, RDFS.label)
+        self.description = result_value(self.properties, DCTERMS.description)
+        self.isPartOf = result_value(self.properties, DCTERMS.isPartOf)
         if not self.title:
             constructed_title = g.query(feature_class_label_sparql.substitute({"URI": self.uri}))
             self.title = str(list(constructed_title.bindings[0].values())[0])
 
-        self.geometries_dict = geom_results
-
-        geom_names = {
-            "asWKT": {"crs": CRS.WGS84},
-            "asDGGS": {"crs": CRS.TB16PIX},
-            "asGeoJSON": {"crs": CRS.WGS84},
-        }
-
+        # geometry literals are held once, by the Geometry objects, while the geometry blank nodes' other properties
+        # (labels, roles etc.) are kept as rows for display
+        self.geometry_properties = []
         for result in geom_results:
-            if result["p2Label"] != Literal('type'): # ignore the typing of the blank nodes
-                geom_type = result["p2"].split("#")[1]
-                geom_literal = result["o2"]
-                self.geometries[geom_type] = Geometry(
-                    geom_literal,
-                    GeometryRole.Boundary,
-                    result.get("p2Label"),
-                    geom_names[geom_type]["crs"],
-                )
+            crs = GEOMETRY_PREDICATES.get(result.p2)
+            if crs is None:
+                if result.p2 != RDF.type:  # ignore the typing of the blank nodes
+                    self.geometry_properties.append(result)
+                continue
+            geom_type = result.p2.split("#")[1]
+            self.geometries[geom_type] = Geometry(
+                result.o2,
+                GeometryRole.Boundary,
+                result.p2Label,
+                crs,
+                predicate=result.p2,
+                prefix=result.p2Prefixed,
+            )
 
         # Feature other properties
         self.extent_spatial = None
@@ -193,11 +196,18 @@ class Feature(object):
         if other_links is not None:
             self.links.extend(other_links)
 
-    def to_dict(self):
-        self.links = [x.__dict__ for x in self.links]
-        if self.geometries is not None:
-            self.geometries = {k: v.to_dict() for k, v in self.geometries.items()}
-        return self.__dict__
+    def to_dict(self) -> dict:
+        return {
+            "uri": self.uri,
+            "identifier": self.identifier,
+            "title": self.title,
+            "description": self.description,
+            "isPartOf": self.isPartOf,
+            "geometries": {k: v.to_dict() for k, v in self.geometries.items()},
+            "extent_spatial": self.extent_spatial,
+            "extent_temporal": self.extent_temporal,
+            "links": [x.to_dict() for x in self.links],
+        }
 
     def to_geo_json_dict(self):
         # this only serialises the Feature properties and WGS84 Geometries
@@ -211,10 +221,8 @@ class Feature(object):
             ]
           },
         """
-        if "GeoJSON" in self.geometries.keys():
-            geojson_geometry = self.geometries["asGeoJSON"].coordinates
-        else:
-            geojson_geometry = self.geometries["asWKT"].to_geo_json_dict()
+        geometry = self.geometries.get("asGeoJSON", self.geometries.get("asWKT"))
+        geojson_geometry = geometry.to_geo_json_dict() if geometry is not None else None
 
         properties = {"title": self.title, "isPartOf": self.isPartOf}
         if self.description is not None:
@@ -223,7 +231,7 @@ class Feature(object):
         return {
             "id": self.uri,
             "type": "Feature",
-            "geometry": rewind(geojson_geometry),
+            "geometry": rewind(geojson_geometry) if geojson_geometry is not None else None,
             "properties": properties,
         }
 
@@ -320,11 +328,11 @@ class FeatureRenderer(Renderer):
 
     def _render_oai_json(self):
         page_json = {
-            "links": [x.__dict__ for x in self.links],
+            "links": [x.to_dict() for x in self.links],
             "feature": self.feature.to_geo_json_dict(),
         }
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.JSON.value),
             headers=self.headers,
@@ -333,17 +341,22 @@ class FeatureRenderer(Renderer):
     def _render_oai_geojson(self):
         page_json = self.feature.to_geo_json_dict()
         if len(self.links) > 0:
-            page_json["links"] = [x.__dict__ for x in self.links]
+            page_json["links"] = [x.to_dict() for x in self.links]
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.GEOJSON.value),
             headers=self.headers,
         )
 
     def _render_oai_html(self):
-        if "asGeoJSON" not in self.feature.geometries.keys():
-            self.feature.geometries["asGeoJSON"] = self.feature.to_geo_json_dict()
+        # GeoJSON for the map, as given or converted from WKT
+        if "asGeoJSON" in self.feature.geometries:
+            map_geometry = self.feature.geometries["asGeoJSON"].coordinates
+        elif "asWKT" in self.feature.geometries:
+            map_geometry = orjson.dumps(self.feature.to_geo_json_dict()).decode()
+        else:
+            map_geometry = None
 
         # need geosparql namespace for prefixes
         GEO = Namespace("http://www.opengis.net/ont/geosparql#")
@@ -456,7 +469,7 @@ class FeatureRenderer(Renderer):
                 switch("other", property, "bnode")
 
         # geometries loop
-        for property in self.feature.geometries_dict:
+        for property in self.feature.geometry_properties:
             matched = False
             for key, value in dicts.items():
                 if (
@@ -468,6 +481,16 @@ class FeatureRenderer(Renderer):
             if not matched:
                 switch("other", property, "geom")
 
+        for geometry in self.feature.geometries.values():
+            geometries[geometry.predicate] = {
+                "uri": geometry.predicate,
+                "prefix": geometry.prefix,
+                "label": geometry.label,
+                "objects": None,
+                "bnodes": None,
+                "geometry": geometry.coordinates,
+            }
+
         def order_properties(key: str, dict: dict, order_list: List[URIRef]) -> int:
             """Orders the properties of a group dict according to the corresponding order list"""
             if key in order_list:
@@ -507,6 +530,7 @@ class FeatureRenderer(Renderer):
         _template_context = {
             "links": self.links,
             "feature": self.feature,
+            "map_geometry": map_geometry,
             "request": self.request,
             "api_title": f"{self.feature.title} - {API_TITLE}",
             "type": sorted(
@@ -525,7 +549,7 @@ class FeatureRenderer(Renderer):
 
         # serialise in the appropriate RDF format
         if self.mediatype in ["application/rdf+json", "application/json"]:
-            return JSONResponse(
+            return Response(
                 g.serialize(format="json-ld"),
                 media_type=self.mediatype,
                 headers=self.headers,
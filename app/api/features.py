@@ -1,25 +1,60 @@
 import re
-from typing import List
+from typing import Iterator, List
 
-from SPARQLWrapper import SPARQLWrapper, JSON
 from fastapi import Response
-from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pyldapi import ContainerRenderer, RDF_MEDIATYPES
 from rdflib import Graph, Literal, URIRef
 from rdflib.namespace import DCTERMS, XSD, RDF
 
-from api.collection import Collection
+from api.collection import get_collection, get_collection_uri
 from api.feature import Feature
 from api.link import *
 from api.profiles import *
 from config import *
 from utils import utils
-from utils.sparql_queries import feature_class_label_sparql
+from utils.sparql_queries import (
+    feature_class_label_sparql,
+    collection_triples_sparql,
+    collection_features_triples_sparql,
+)
+from utils.templates import templates
 
-templates = Jinja2Templates(directory="templates")
 g = utils.g
 
+# RDF Media Types that can be streamed for a whole collection (N-Triples is also valid Turtle), with the file extension
+# each is downloaded with
+STREAMABLE_MEDIATYPES = {"application/n-triples": "nt", "text/turtle": "ttl"}
+
+# a blank node subject, or a blank node object right before the closing " ." of an N-Triples line
+BNODE_SUBJECT = re.compile(rb"^_:")
+BNODE_OBJECT = re.compile(rb"(\s)_:(?=[^\s\"]+\s*\.\s*$)")
+
+
+def _scope_bnodes(line: bytes, scope: bytes) -> bytes:
+    """Prefixes the blank node labels of an N-Triples line with a scope
+
+    Blank node labels are only unique within a single store response so the labels of each page of an export are
+    scoped to stop a client merging distinct blank nodes from different pages.
+    """
+    line = BNODE_SUBJECT.sub(b"_:" + scope, line)
+    return BNODE_OBJECT.sub(lambda m: m.group(1) + b"_:" + scope, line, count=1)
+
+
+def _buffered(lines: Iterator[bytes], size: int = 65536) -> Iterator[bytes]:
+    """Joins lines into chunks of roughly size bytes to avoid a socket write per triple"""
+    buffer = []
+    buffered = 0
+    for line in lines:
+        buffer.append(line)
+        buffered += len(line) + 1
+        if buffered >= size:
+            yield b"\n".join(buffer) + b"\n"
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"\n".join(buffer) + b"\n"
+
 
 class FeaturesList:
     def __init__(self, request, collection_id):
@@ -36,15 +71,7 @@ class FeaturesList:
         )
 
         # get Collection
-        self.collection = Collection
-        result = g.query(
-            f"""PREFIX dcterms: <http://purl.org/dc/terms/> 
-                SELECT ?collection 
-                {{?collection dcterms:identifier "{collection_id}"^^xsd:token}}
-                """
-        )
-        collection = str(list(result.bindings[0].values())[0])
-        self.collection = Collection(collection)
+        self.collection = get_collection(get_collection_uri(collection_id))
 
         # filter if we have a filtering param
         if request.query_params.get("bbox") is not None:
@@ -194,6 +221,9 @@ class FeaturesList:
         # for r in get_graph().query(q):
         #     features_uris.append((r["f"], r["prefLabel"]))
 
+        # only needed here, so not imported until a DGGS bbox is asked for
+        from SPARQLWrapper import SPARQLWrapper, JSON
+
         sparql = SPARQLWrapper(SPARQL_ENDPOINT)
         sparql.setQuery(q)
         sparql.setReturnFormat(JSON)
@@ -309,6 +339,7 @@ class FeaturesRenderer(ContainerRenderer):
             "per_page",
             "limit",
             "bbox",
+            "all",
         ]
 
         allowed_bbox_formats = [
@@ -375,17 +406,19 @@ class FeaturesRenderer(ContainerRenderer):
         elif self.profile == "geosp":
             if self.mediatype == MediaType.HTML.value:
                 return self._render_oai_html()
+            elif self.request.query_params.get("all") == "true":
+                return self._render_geosp_stream()
             else:
                 return self._render_geosp_rdf()
 
     def _render_oai_json(self):
         page_json = {
-            "links": [x.__dict__ for x in self.links],
+            "links": [x.to_dict() for x in self.links],
             "collection": self.feature_list.collection.to_dict(),
             "items": self.members,
         }
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.JSON.value),
             headers=self.headers,
@@ -393,12 +426,12 @@ class FeaturesRenderer(ContainerRenderer):
 
     def _render_oai_geojson(self):
         page_json = {
-            "links": [x.__dict__ for x in self.links],
+            "links": [x.to_dict() for x in self.links],
             "collection": self.feature_list.collection.to_geo_json_dict(),
             "items": self.members,
         }
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.GEOJSON.value),
             headers=self.headers,
@@ -495,7 +528,7 @@ class FeaturesRenderer(ContainerRenderer):
 
         # serialise in the appropriate RDF format
         if self.mediatype in ["application/rdf+json", "application/json"]:
-            return JSONResponse(
+            return Response(
                 g.serialize(format="json-ld"),
                 media_type=self.mediatype,
                 headers=self.headers,
@@ -512,3 +545,51 @@ class FeaturesRenderer(ContainerRenderer):
                 status_code=400,
                 media_type="text/plain",
             )
+
+    def _stream_geosp_ntriples(self) -> Iterator[bytes]:
+        """Yields every triple of the collection and its features as N-Triples, one page of features at a time"""
+        collection_uri = self.feature_list.collection.uri
+        for line in utils.construct_ntriples(
+            collection_triples_sparql.substitute({"URI": collection_uri})
+        ):
+            yield _scope_bnodes(line, b"c")
+
+        page = 0
+        while True:
+            empty = True
+            for line in utils.construct_ntriples(
+                collection_features_triples_sparql.substitute(
+                    {
+                        "URI": collection_uri,
+                        "LIMIT": EXPORT_CHUNK_SIZE,
+                        "OFFSET": page * EXPORT_CHUNK_SIZE,
+                    }
+                )
+            ):
+                empty = False
+                yield _scope_bnodes(line, f"p{page}x".encode())
+            if empty:
+                break
+            page += 1
+
+    def _render_geosp_stream(self):
+        if self.mediatype not in STREAMABLE_MEDIATYPES:
+            return Response(
+                "A whole collection can only be streamed as one of {}".format(
+                    ", ".join(STREAMABLE_MEDIATYPES)
+                ),
+                status_code=400,
+                media_type="text/plain",
+            )
+
+        headers = dict(self.headers)
+        headers["Content-Disposition"] = "attachment; filename={}.{}".format(
+            self.feature_list.collection.identifier, STREAMABLE_MEDIATYPES[self.mediatype]
+        )
+
+        # compressed on the fly by the CompressionMiddleware if the client accepts it
+        return StreamingResponse(
+            _buffered(self._stream_geosp_ntriples()),
+            media_type=self.mediatype,
+            headers=headers,
+        )
@@ -1,24 +1,27 @@
 from typing import List
 import json
+import orjson
 from config import *
 from api.link import *
 from api.profiles import *
 from utils import utils
+from utils.cache import BodyCache
+from utils.labels import add_labels
+from utils.rows import BnodePropertyRow, PropertyRow, add_prefixes
+from utils.templates import templates
+from utils.utils import result_value
 
 from geomet import wkt
 from fastapi import Response
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse
 from pyldapi import Renderer, RDF_MEDIATYPES
 
 from rdflib import URIRef, Literal, Graph
 from rdflib.namespace import DCAT, DCTERMS, RDF, RDFS
 
-import markdown
 import logging
 
 
-templates = Jinja2Templates(directory="templates")
 g = utils.g
 
 
@@ -32,60 +35,40 @@ class LandingPage:
         self.dataset_uri = DATASET_URI
         self.description = None
 
-        dataset_triples = g.query(f"""DESCRIBE <{self.dataset_uri}>""").graph
-        self.title = dataset_triples.value(URIRef(self.dataset_uri), RDFS.label)
-        self.description = dataset_triples.value(
-            URIRef(self.dataset_uri), DCTERMS.description
-        )
-
         non_bnode_query = g.query(
             f"""
             PREFIX dcat: <http://www.w3.org/ns/dcat#>
             PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
             PREFIX dcterms: <http://purl.org/dc/terms/> 
-            SELECT ?p1 ?p1Label ?o1 ?o1Label {{
+            SELECT ?p1 ?o1 {{
                 <{self.dataset_uri}> ?p1 ?o1 .
-                OPTIONAL {{ 
-                    {{?p1 rdfs:label ?p1Label}} FILTER(lang(?p1Label) = "" || lang(?p1Label) = "en") }}
-                OPTIONAL {{ 
-                    {{?o1 rdfs:label ?o1Label}} FILTER(lang(?o1Label) = "" || lang(?o1Label) = "en") }}
-                VALUES ?feature {{ dcterms:creator dcterms:created dcterms:publisher dcterms:modified dcat:keyword dcat:theme }}
+                VALUES ?feature {{ rdfs:label dcterms:description dcterms:creator dcterms:created dcterms:publisher dcterms:modified dcat:keyword dcat:theme }}
   				FILTER(?p1=?feature)
                 }}"""
         )
-        non_bnode_results = [{str(k): v for k, v in i.items()} for i in non_bnode_query.bindings]
+        non_bnode_results = PropertyRow.from_result(non_bnode_query)
 
         bnode_query = g.query(
             f"""
             PREFIX dcterms: <http://purl.org/dc/terms/> 
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#> 
-            SELECT ?p1 ?p1Label ?p2 ?p2Label ?o2 ?o2Label ?o1 {{
+            SELECT ?p1 ?p2 ?o2 ?o1 {{
                 <{self.dataset_uri}> ?p1 ?o1 .
                 ?o1 ?p2 ?o2
-                OPTIONAL {{ 
-                    {{?p1 rdfs:label ?p1Label}} FILTER(lang(?p1Label) = "" || lang(?p1Label) = "en") }}
-                OPTIONAL {{
-                    {{?p2 rdfs:label ?p2Label}} FILTER(lang(?p2Label) = "" || lang(?p2Label) = "en") }}
-                OPTIONAL {{ 
-                    {{?o2 rdfs:label ?o2Label}} FILTER(lang(?o2Label) = "" || lang(?o2Label) = "en") }}
                 FILTER(ISBLANK(?o1))
                 }}"""
         )
-        bnode_results = [
-            {str(k): v for k, v in i.items()} for i in bnode_query.bindings
-        ]
+        bnode_results = BnodePropertyRow.from_result(bnode_query)
+        add_labels((non_bnode_results, ["p1", "o1"]), (bnode_results, ["p1", "p2", "o2"]))
 
-        for result_set in [non_bnode_results, bnode_results]:
-            for property in result_set:
-                for k, v in property.copy().items():
-                    if isinstance(v, URIRef):
-                        property[f"{k}Prefixed"] = v.n3(
-                            dataset_triples.namespace_manager
-                        )
+        add_prefixes(non_bnode_results + bnode_results)
         
         self.properties = [i for i in non_bnode_results]
         self.bnode_properties = [i for i in bnode_results]
 
+        self.title = result_value(self.properties, RDFS.label)
+        self.description = result_value(self.properties, DCTERMS.description)
+
         logging.debug("LandingPage() RDF loops")
 
         # make links
@@ -139,14 +122,45 @@ class LandingPage:
         logging.debug("LandingPage() complete")
 
 
+class CachedLandingPage:
+    """A built landing page along with its rendered bodies, replaced as a whole when the landing page is rebuilt
+
+    The HTML pages are kept for as many of the base URLs they are asked for on as MAX_BASE_URLS, the least recently
+    asked for dropped.
+    """
+
+    MAX_BASE_URLS = 16
+
+    def __init__(self, landing_page: LandingPage):
+        self.landing_page = landing_page
+        # the JSON and RDF bodies, and the HTML pages for each base URL, which comes from the request's Host header
+        self.bodies = BodyCache(maxsize=2 * self.MAX_BASE_URLS + 8)
+
+
+cached = None
+
+
+def load_landing_page() -> None:
+    """Builds the landing page from the store, replacing the cached one"""
+    global cached
+    cached = CachedLandingPage(LandingPage())
+
+
+def current_landing_page() -> CachedLandingPage:
+    """Returns the cached landing page
+
+    It is only rebuilt when the data is (re)loaded, which versions it anew, so that its ETag changes with it.
+    """
+    if cached is None:
+        load_landing_page()
+    return cached
+
+
 class LandingPageRenderer(Renderer):
-    def __init__(
-        self,
-        request,
-        other_links: List[Link] = None,
-    ):
+    def __init__(self, request):
         logging.debug("LandingPageRenderer()")
-        self.landing_page = LandingPage(other_links=other_links)
+        self.cached = current_landing_page()
+        self.landing_page = self.cached.landing_page
         super().__init__(
             request,
             self.landing_page.uri,
@@ -194,6 +208,13 @@ class LandingPageRenderer(Renderer):
                 return self._render_dcat_html()
 
     def _render_oai_json(self):
+        return Response(
+            self.cached.bodies.get("oai-json", self._oai_json),
+            media_type=str(MediaType.JSON.value),
+            headers=self.headers,
+        )
+
+    def _oai_json(self) -> bytes:
         page_json = {}
 
         links = []
@@ -220,11 +241,16 @@ class LandingPageRenderer(Renderer):
         if self.landing_page.description is not None:
             page_json["description"] = self.landing_page.description
 
-        return JSONResponse(
-            page_json, media_type=str(MediaType.JSON.value), headers=self.headers
-        )
+        return orjson.dumps(page_json)
 
     def _render_oai_html(self):
+        # the page links to static files by absolute URL, so is cached per base URL the API is reached on
+        return HTMLResponse(
+            self.cached.bodies.get(("oai-html", str(self.request.base_url)), self._oai_html),
+            headers=self.headers,
+        )
+
+    def _oai_html(self) -> bytes:
         # property dicts
         type = {}
         properties = {}
@@ -364,13 +390,18 @@ class LandingPageRenderer(Renderer):
             "api_title": API_TITLE
         }
 
-        return templates.TemplateResponse(
-            name="landing_page_oai.html",
-            context=_template_context,
-            headers=self.headers,
-        )
+        return templates.get_template("landing_page_oai.html").render(_template_context).encode("utf-8")
 
     def _render_dcat_rdf(self):
+        body = self.cached.bodies.get(("dcat", self.mediatype), self._dcat_rdf)
+
+        # serialise in the appropriate RDF format
+        if self.mediatype in ["application/rdf+json", "application/json"]:
+            return HTMLResponse(body, media_type=self.mediatype)
+        else:
+            return Response(body, media_type=self.mediatype)
+
+    def _dcat_rdf(self) -> bytes:
         g = Graph()
         g.bind("dcat", DCAT)
         g.add((URIRef(self.landing_page.uri), RDF.type, DCAT.Dataset))
@@ -389,17 +420,18 @@ class LandingPageRenderer(Renderer):
             )
         )
 
-        # serialise in the appropriate RDF format
         if self.mediatype in ["application/rdf+json", "application/json"]:
-            return HTMLResponse(
-                g.serialize(format="json-ld"), media_type=self.mediatype
-            )
+            return g.serialize(format="json-ld", encoding="utf-8")
         else:
-            return Response(
-                g.serialize(format=self.mediatype), media_type=self.mediatype
-            )
+            return g.serialize(format=self.mediatype, encoding="utf-8")
 
     def _render_dcat_html(self):
+        return HTMLResponse(
+            self.cached.bodies.get(("dcat-html", str(self.request.base_url)), self._dcat_html),
+            headers=self.headers,
+        )
+
+    def _dcat_html(self) -> bytes:
         # _template_context = {
         #     "uri": self.dataset.uri,
         #     "label": self.dataset.label,
@@ -419,6 +451,4 @@ class LandingPageRenderer(Renderer):
             "footer": FOOTER
         }
 
-        return templates.TemplateResponse(
-            name="dataset.html", context=_template_context, headers=self.headers
-        )
+        return templates.get_template("dataset.html").render(_template_context).encode("utf-8")
@@ -56,5 +56,12 @@ class Link(object):
 
         return http
 
-    def to_dict(self):
-        return self.__dict__
+    def to_dict(self) -> dict:
+        return {
+            "href": self.href,
+            "rel": self.rel.value if isinstance(self.rel, Enum) else self.rel,
+            "type": self.type.value if isinstance(self.type, Enum) else self.type,
+            "hreflang": self.hreflang.value if isinstance(self.hreflang, Enum) else self.hreflang,
+            "title": self.title,
+            "length": self.length,
+        }
@@ -1,14 +1,11 @@
 from fastapi import Response
-from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import ORJSONResponse
 from pyldapi import Renderer
 
 from api.link import *
 from api.profiles import *
 from config import *
-
-
-templates = Jinja2Templates(directory="templates")
+from utils.templates import templates
 
 
 class SparqlRenderer(Renderer):
@@ -52,7 +49,7 @@ class SparqlRenderer(Renderer):
     def _render_oai_json(self):
         page_json = {"sparql": "sparql endpoint"}
 
-        return JSONResponse(
+        return ORJSONResponse(
             page_json,
             media_type=str(MediaType.JSON.value),
             headers=self.headers,
@@ -1,22 +1,43 @@
+import anyio
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import uvicorn
 import httpx
 import uuid
 import logging
-from typing import Union
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Set, Tuple, Union
 from config import *
 # from pyldapi import renderer, renderer_container
 from utils import utils
+from utils import labels
+from utils import curies
+from utils import changes
+from utils.profiling import ProfileStore
+from utils.shared_cache import SharedCache
+from utils.redis_cache import RedisCache, TieredCache
+from utils.warmer import CacheWarmer, Popularity
 
 from starlette.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
-from routers import landing_page, conformance, collections, sparql
+from routers import landing_page, conformance, collections, sparql, profiles
 from monitoring import logging_config
 from middlewares.correlation_id_middleware import CorrelationIdMiddleware
 from middlewares.logging_middleware import LoggingMiddleware
+from middlewares.snapshot_middleware import SnapshotMiddleware
+from middlewares.compression_middleware import CompressionMiddleware
+from middlewares.conditional_get_middleware import ConditionalGetMiddleware
+from middlewares.profiling_middleware import ProfilingMiddleware
+from middlewares.readiness_middleware import ReadinessMiddleware
+from middlewares.shared_cache_middleware import SharedCacheMiddleware
+from middlewares.backpressure_middleware import BackpressureMiddleware
+from middlewares.stale_if_error_middleware import StaleIfErrorMiddleware
+from middlewares.popularity_middleware import PopularityMiddleware
 from api import landing_page as landing_page_api
 from api import collection as collection_api
+from api import conformance as conformance_api
 from api import collections as collections_api
 from api import feature as feature_api
 from api import features as features_api
@@ -30,10 +51,86 @@ api = FastAPI(
 
 LOGGING = True # toggles logging, set to false for proper error messages
 
+# the threads anyio's threadpool has by default
+ANYIO_DEFAULT_THREADS = 40
+
+api.add_middleware(BackpressureMiddleware, limiter=utils.store_limiter, retry_after=STORE_RETRY_AFTER)
+
+if SNAPSHOT_DIR:
+    api.add_middleware(SnapshotMiddleware, directory=SNAPSHOT_DIR)
+
+# rendered responses shared by all the workers on the host
+shared_cache = None
+if SHARED_CACHE_DIR:
+    shared_cache = SharedCache(SHARED_CACHE_DIR, SHARED_CACHE_SIZE, SHARED_CACHE_MAX_ENTRY_SIZE)
+
+# rendered responses and query results shared by all the replicas, behind the workers' shared cache
+redis_cache = None
+if REDIS_URL:
+    redis_cache = RedisCache(
+        REDIS_URL,
+        prefix=REDIS_PREFIX,
+        ttl=REDIS_TTL,
+        timeout=REDIS_TIMEOUT,
+        retry_seconds=REDIS_RETRY_SECONDS,
+        max_entry_bytes=REDIS_MAX_ENTRY_SIZE,
+        level=COMPRESSION_LEVEL,
+    )
+    utils.query_cache = redis_cache
+
+response_caches = [cache for cache in (shared_cache, redis_cache) if cache is not None]
+if response_caches:
+    api.add_middleware(SharedCacheMiddleware, cache=TieredCache(*response_caches))
+
+# where the workers agree the version of the data, across replicas if there is a Redis server
+versions = redis_cache or shared_cache
+versions_poll_seconds = REDIS_POLL_SECONDS if redis_cache is not None else SHARED_CACHE_POLL_SECONDS
+# held while the data is reloaded, so that reloads don't interleave
+reloading = threading.Lock()
+
+api.add_middleware(ConditionalGetMiddleware)
+
+api.add_middleware(StaleIfErrorMiddleware, max_bytes=STALE_CACHE_SIZE, max_entry_bytes=STALE_CACHE_MAX_ENTRY_SIZE)
+
+# renders the pages most likely to be asked for in the background, after every (re)load
+warmer = None
+if WARM_CACHE:
+    popularity = None
+    if WARM_POPULAR > 0:
+        popularity = Popularity(WARM_POPULARITY_SIZE, WARM_POPULARITY_FILE)
+        api.add_middleware(PopularityMiddleware, popularity=popularity)
+    warmer = CacheWarmer(
+        api,
+        LANDING_PAGE_URL,
+        pages=[page.strip() for page in WARM_PAGES.split(",") if page.strip()] if WARM_PAGES else None,
+        items_pages=WARM_ITEMS_PAGES,
+        mediatypes=[mediatype.strip() for mediatype in WARM_MEDIATYPES.split(",") if mediatype.strip()],
+        popularity=popularity,
+        popular=WARM_POPULAR,
+        interval=WARM_INTERVAL,
+        concurrency=WARM_CONCURRENCY,
+    )
+
+api.add_middleware(ReadinessMiddleware)
+
 if LOGGING:
     logging_config.configure_logging(level='INFO', service='ogc-api', instance=str(uuid.uuid4()))
     api.add_middleware(LoggingMiddleware)
 
+api.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
+if PROFILE_DIR:
+    # requests are only profiled on demand, and the profiles only shown, given PROFILE_TOKEN
+    profiles.store = ProfileStore(PROFILE_DIR, PROFILE_BUFFER_SIZE)
+    profiles.token = PROFILE_TOKEN
+    api.add_middleware(
+        ProfilingMiddleware,
+        store=profiles.store,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        interval=PROFILE_INTERVAL,
+        token=PROFILE_TOKEN,
+    )
+
 api.add_middleware(CorrelationIdMiddleware)
 
 api.add_middleware(
@@ -47,43 +144,196 @@ api.add_middleware(
 @api.get("/spec", summary="API Description Page")
 def spec():
     openapi_json = api.openapi()
-    return JSONResponse(openapi_json)
+    return ORJSONResponse(openapi_json)
 
 
 @api.get("/reload-data", summary="Endpoint to reload data from graph")
-def reload():
+def reload(full: bool = False):
     try:
-        utils.get_graph()
-        configure_data()
-        return JSONResponse(content="Data reloaded.", status_code=200)
+        changed = reload_data(full=full)
+        if changed is None:
+            return ORJSONResponse(content="Data reloaded.", status_code=200)
+        return ORJSONResponse(
+            content={"message": "Data reloaded.", "changed_collections": sorted(changed)}, status_code=200
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        return HTTPException(content=e, status_code=500)
+        raise HTTPException(detail=str(e), status_code=500)
+
+
+@api.get("/health/live", summary="Liveness Check")
+def health_live():
+    return ORJSONResponse({"status": "live"})
+
+
+@api.get("/health/ready", summary="Readiness Check")
+def health_ready():
+    if utils.ready.is_set():
+        return ORJSONResponse({"status": "ready"})
+    return ORJSONResponse({"status": "loading"}, status_code=503)
+
+
+@api.get("/health/store", summary="Store Query Queue & Circuit Breaker")
+def health_store():
+    return ORJSONResponse(
+        {
+            **utils.store_limiter.stats(),
+            "breaker": utils.store_breaker.stats(),
+            "proxy_breaker": utils.proxy_breaker.stats(),
+        }
+    )
+
+
+@api.on_event("startup")
+def startup():
+    size_threadpool()
+    # load in the background, so the worker is up (and live) straight away and ready once the data is loaded
+    threading.Thread(target=load_data, name="load-data", daemon=True).start()
 
 
-def configure():
-    # Load data
-    logging.info("Loading graph")
+def size_threadpool():
+    """Gives the threadpool the sync endpoints run on a thread for every query the store limiter lets run or queues
+
+    With fewer, requests would queue for a thread rather than for the store, unseen by the limiter, so its queue could
+    never get deep enough for any to be turned away (see BackpressureMiddleware). anyio's default threads are kept on
+    top, for everything else the endpoints do.
+    """
+    if utils.store_limiter.limit <= 0:
+        return
+    threads = anyio.to_thread.current_default_thread_limiter()
+    threads.total_tokens = ANYIO_DEFAULT_THREADS + utils.store_limiter.threads_needed()
+    logging.info(f"Threadpool sized to {threads.total_tokens} threads")
+
+
+def load_data():
+    """Fetches the theming files and loads the data, retrying until it succeeds, then marks the API ready"""
+    set_theme()
+    while True:
+        try:
+            logging.info("Loading graph")
+            load_graph()
+            logging.info("Graph loaded")
+            configure_data()
+            break
+        except Exception as e:
+            logging.error(f"Unable to load data, retrying in {LOAD_RETRY_SECONDS} seconds: {e}")
+            time.sleep(LOAD_RETRY_SECONDS)
+    utils.ready.set()
+    logging.info("Ready")
+    if warmer is not None:
+        warmer.start()
+    if versions is not None:
+        threading.Thread(target=watch_dataset_version, name="watch-dataset-version", daemon=True).start()
+
+
+def load_graph():
+    """Loads the graph, agreeing the version of the data with the other workers if they share a cache
+
+    A worker starting up joins the version the others are on if it has loaded the same data (or publishes its own if
+    not, for them to reload to), a reload publishes a new one for them to reload to.
+    """
     utils.get_graph()
-    logging.info("Graph loaded")
-    configure_routing()
-    configure_data()
+    utils.fingerprint_data()
+    if versions is not None:
+        utils.adopt_version(
+            *versions.join_version(utils.dataset_version, utils.dataset_modified, utils.dataset_digest())
+        )
+    utils.g.version = utils.dataset_version
+
 
+def reload_data(full: bool = False, published: Optional[Tuple[str, datetime]] = None) -> Optional[Set[str]]:
+    """Reloads the data, returning the identifiers of the collections that changed, or None if it was all reloaded
 
-def configure_data():
+    Unless a full reload is asked for, the data is fingerprinted and compared with what was loaded (see changes.py),
+    and if only some collections have changed just what is held for those is dropped, the responses for the others
+    keeping their versions (and so their ETags and cached copies). A full reload asked for marks every version as
+    changed, the fingerprint not noticing every edit. Given the version published by another worker, it is taken on
+    rather than a new one published. Reloads (asked for, or following another worker's) are made one at a time.
+    """
+    with reloading:
+        if published is not None and utils.version_mark(published[0]) != utils.reload_mark:
+            full = True  # the other worker was asked for a full reload
+
+        previous = utils.fingerprint
+        if not full and previous is not None:
+            utils.open_graph()
+            try:
+                current = changes.fingerprint(utils.g.graph)
+            except Exception as e:
+                logging.error(f"Unable to fingerprint the data, reloading it all. {e}")
+                current = None
+            changed = previous.changes(current) if current is not None else None
+            if changed is not None:
+                utils.version_data(current, changed)
+                if published is not None:
+                    utils.adopt_version(*published)
+                elif changed and versions is not None:
+                    versions.publish_version(
+                        utils.dataset_version, utils.dataset_modified, utils.dataset_digest(), clear=False
+                    )
+                utils.g.version = utils.dataset_version
+                configure_data(changed)
+                logging.info(f"Collections changed: {', '.join(sorted(changed)) or 'none'}")
+                if changed and warmer is not None:
+                    warmer.trigger()
+                return changed
+
+        if full and published is None:
+            utils.mark_reload()
+        utils.get_graph()
+        utils.fingerprint_data()
+        if published is not None:
+            utils.adopt_version(*published)
+        elif versions is not None:
+            versions.publish_version(utils.dataset_version, utils.dataset_modified, utils.dataset_digest())
+        utils.g.version = utils.dataset_version
+        configure_data()
+        if warmer is not None:
+            warmer.trigger()
+        return None
+
+
+def watch_dataset_version():
+    """Reloads the data when another worker sharing the cache has, so all the workers answer from the same data"""
+    while True:
+        time.sleep(versions_poll_seconds)
+        published = versions.read_version()
+        if published is None or published[0] == utils.dataset_version:
+            continue
+        try:
+            logging.info("Data reloaded by another worker, reloading")
+            reload_data(published=published)
+        except Exception as e:
+            logging.error(f"Unable to reload data: {e}")
+
+
+def configure_data(changed: Optional[Set[str]] = None):
+    """Hands the loaded data to the API, dropping everything held from earlier data, or given the collections that
+    changed in a partial reload, just what was held for them (and the landing page, which counts them)"""
     landing_page_api.g = utils.g
     collection_api.g = utils.g
     collections_api.g = utils.g
     feature_api.g = utils.g
     features_api.g = utils.g
-    conformance.g = utils.g
     collections.g = utils.g
     landing_page_api.prefixes = utils.prefixes
     collection_api.prefixes = utils.prefixes
     collections_api.prefixes = utils.prefixes
     feature_api.prefixes = utils.prefixes
     features_api.prefixes = utils.prefixes
-    conformance.prefixes = utils.prefixes
     collections.prefixes = utils.prefixes
+    if changed is not None:
+        if changed:
+            labels.cache.clear()
+            collection_api.forget_collections(changed)
+            landing_page_api.load_landing_page()
+        return
+    curies.load_prefixes(utils.prefixes)
+    labels.cache.clear()
+    collection_api.clear_collections()
+    conformance_api.load_conformance_classes(utils.g)
+    landing_page_api.load_landing_page()
     # renderer.MEDIATYPE_NAMES = MEDIATYPE_NAMES
     # renderer_container.MEDIATYPE_NAMES = MEDIATYPE_NAMES
 
@@ -94,7 +344,8 @@ def configure_routing():
     api.include_router(conformance.router)
     api.include_router(collections.router)
     api.include_router(sparql.router)
-    set_theme()
+    if PROFILE_DIR:
+        api.include_router(profiles.router)
 
 def set_theme():
     """
@@ -138,9 +389,10 @@ def get_theming_file(env_var: Union[str, None], var_name: str, is_html: bool = T
             with open(new_file, "w") as f:
                 f.write("")
 
+configure_routing()
+
 if __name__ == "__main__":
     logging.info("Running main function")
-    configure()
     if LOGGING:
         uvicorn.run(
             api,
@@ -158,4 +410,3 @@ if __name__ == "__main__":
         )
 else:
     logging.info("Running uvicorn function")
-    configure()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from rdflib import Namespace
 
 __version__ = "1.2"
@@ -31,6 +32,52 @@ TEST_GRAPH = os.getenv("TEST_GRAPH", None)
 HEADER = os.getenv("HEADER", None)
 FOOTER = os.getenv("FOOTER", None)
 STYLESHEET = os.getenv("STYLESHEET", None)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 500))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", None)
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", 6))
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", 300))
+LABEL_CACHE_SIZE = int(os.getenv("LABEL_CACHE_SIZE", 10000))
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 10000))
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ogcldapi-templates"))
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR", None)
+SHARED_CACHE_SIZE = int(os.getenv("SHARED_CACHE_SIZE", 256 * 1024 * 1024))
+SHARED_CACHE_MAX_ENTRY_SIZE = int(os.getenv("SHARED_CACHE_MAX_ENTRY_SIZE", 4 * 1024 * 1024))
+SHARED_CACHE_POLL_SECONDS = float(os.getenv("SHARED_CACHE_POLL_SECONDS", 1))
+REDIS_URL = os.getenv("REDIS_URL", None)
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "ogcldapi")
+REDIS_TTL = int(os.getenv("REDIS_TTL", 24 * 60 * 60))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 0.5))
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", 30))
+REDIS_MAX_ENTRY_SIZE = int(os.getenv("REDIS_MAX_ENTRY_SIZE", 1024 * 1024))
+REDIS_POLL_SECONDS = float(os.getenv("REDIS_POLL_SECONDS", 5))
+STORE_CONCURRENCY = int(os.getenv("STORE_CONCURRENCY", 16))
+STORE_QUEUE_LIMIT = int(os.getenv("STORE_QUEUE_LIMIT", 64))
+STORE_INTERACTIVE_SLOTS = int(os.getenv("STORE_INTERACTIVE_SLOTS", STORE_CONCURRENCY // 4))
+STORE_RETRY_AFTER = int(os.getenv("STORE_RETRY_AFTER", 2))
+STORE_TIMEOUT = float(os.getenv("STORE_TIMEOUT", 30))
+STORE_SLOW_SECONDS = float(os.getenv("STORE_SLOW_SECONDS", 10))
+STORE_BREAKER_WINDOW = int(os.getenv("STORE_BREAKER_WINDOW", 20))
+STORE_BREAKER_MIN_QUERIES = int(os.getenv("STORE_BREAKER_MIN_QUERIES", 10))
+STORE_BREAKER_FAILURE_RATIO = float(os.getenv("STORE_BREAKER_FAILURE_RATIO", 0.5))
+STORE_BREAKER_COOLDOWN = float(os.getenv("STORE_BREAKER_COOLDOWN", 30))
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", 64 * 1024 * 1024))
+STALE_CACHE_MAX_ENTRY_SIZE = int(os.getenv("STALE_CACHE_MAX_ENTRY_SIZE", 1024 * 1024))
+LOAD_RETRY_SECONDS = int(os.getenv("LOAD_RETRY_SECONDS", 10))
+WARM_CACHE = os.getenv("WARM_CACHE", "false").lower() == "true"
+WARM_PAGES = os.getenv("WARM_PAGES", None)
+WARM_ITEMS_PAGES = int(os.getenv("WARM_ITEMS_PAGES", 1))
+WARM_MEDIATYPES = os.getenv("WARM_MEDIATYPES", "text/html,application/json,application/geo+json")
+WARM_POPULAR = int(os.getenv("WARM_POPULAR", 0))
+WARM_POPULARITY_FILE = os.getenv("WARM_POPULARITY_FILE", None)
+WARM_POPULARITY_SIZE = int(os.getenv("WARM_POPULARITY_SIZE", 10000))
+WARM_INTERVAL = float(os.getenv("WARM_INTERVAL", 60 * 60))
+WARM_CONCURRENCY = int(os.getenv("WARM_CONCURRENCY", 2))
+PROFILE_DIR = os.getenv("PROFILE_DIR", None)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", 100))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.001))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", None)
 
 MEDIATYPE_NAMES = {
     "text/html": "HTML",
@@ -0,0 +1,40 @@
+from starlette.datastructures import QueryParams
+from starlette.responses import PlainTextResponse
+
+from middlewares.readiness_middleware import UNGUARDED_PATHS
+from utils.store import BULK, INTERACTIVE, PROXY, StoreLimiter
+
+
+def request_priority(scope) -> int:
+    """The priority of a request's store queries: SPARQL endpoint queries, whole collection exports or pages"""
+    if scope["path"] in ("/sparql", "/endpoint"):
+        return PROXY
+    if scope["path"].endswith("/items") and QueryParams(scope["query_string"]).get("all") == "true":
+        return BULK
+    return INTERACTIVE
+
+
+class BackpressureMiddleware:
+    def __init__(self, app, limiter: StoreLimiter, retry_after: int = 2):
+        self.app = app
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+    # Answer 503 Service Unavailable while the queue for the store is too deep to take on another request of the same
+    # priority, rather than queueing it for longer than the client would wait. Runs inside the caches, so what they
+    # hold is still served.
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(UNGUARDED_PATHS)
+            or not self.limiter.busy(request_priority(scope))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        response = PlainTextResponse(
+            "The API is busy, please try again shortly",
+            status_code=503,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+        await response(scope, receive, send)
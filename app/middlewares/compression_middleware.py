@@ -0,0 +1,89 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils.compression import StreamCompressor, compress, is_compressible, negotiate_encoding
+
+# bodies larger than this are compressed off the event loop
+THREADPOOL_SIZE = 256 * 1024
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    # Compress responses with the best Content-Encoding the client accepts (brotli or gzip)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        initial_message = {}
+        pending = []
+        pending_size = 0
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal initial_message, pending_size, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                # hold the headers back until enough of the body has been seen to decide whether to compress
+                initial_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                pending.append(body)
+                pending_size += len(body)
+                if more_body and pending_size < self.minimum_size:
+                    return
+                body = b"".join(pending)
+                pending.clear()
+
+                headers = MutableHeaders(raw=initial_message["headers"])
+                if (
+                    "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                    or (len(body) < self.minimum_size and not more_body)
+                ):
+                    # already encoded (e.g. a precompressed snapshot), not worth it or too small
+                    passthrough = True
+                    await send(initial_message)
+                    await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                    return
+
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    if len(body) > THREADPOOL_SIZE:
+                        body = await run_in_threadpool(compress, body, encoding)
+                    else:
+                        body = compress(body, encoding)
+                    headers["Content-Length"] = str(len(body))
+                    passthrough = True
+                    await send(initial_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                # streamed response, compress chunk by chunk
+                del headers["Content-Length"]
+                compressor = StreamCompressor(encoding)
+                await send(initial_message)
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.flush()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
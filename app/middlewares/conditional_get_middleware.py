@@ -0,0 +1,106 @@
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+from api.conneg import cache_control, negotiate
+from utils import changes, utils
+
+
+def make_etag(request, renderer) -> str:
+    """A weak ETag for a response, from the version of the data it is made from and what the request negotiated to"""
+    key = "|".join(
+        [
+            utils.version_for(request.url.path)[0],
+            request.url.path,
+            request.url.query,
+            renderer.profile,
+            renderer.mediatype,
+            renderer.language,
+        ]
+    )
+    return 'W/"{}"'.format(hashlib.blake2b(key.encode(), digest_size=12).hexdigest())
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """Weak comparison of an ETag against an If-None-Match header
+
+    "*" isn't taken to match, as whether there is a resource at all isn't known until the request is answered.
+    """
+    opaque = etag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def known_collection(path: str) -> bool:
+    """Whether a path isn't for a collection (or its items), or is for one that is loaded"""
+    identifier = changes.collection_from_path(path)
+    return identifier is None or identifier in utils.collection_versions
+
+
+def not_modified_since(modified, if_modified_since: str) -> bool:
+    try:
+        return modified <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+class ConditionalGetMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    # Add validators & Cache-Control to content negotiated responses and answer revalidations with 304 Not Modified,
+    # before any request for data is made to the store. A date is only revalidated for collections that are loaded, any
+    # date being later than the version of a collection that doesn't exist.
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or utils.dataset_version is None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        renderer = negotiate(request)
+        if renderer is None:
+            await self.app(scope, receive, send)
+            return
+
+        modified = utils.version_for(request.url.path)[1]
+        validators = {
+            "ETag": make_etag(request, renderer),
+            "Last-Modified": format_datetime(modified, usegmt=True),
+            "Cache-Control": cache_control(request.url.path),
+            "Vary": "Accept, Accept-Profile",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if (if_none_match is not None and etag_matches(validators["ETag"], if_none_match)) or (
+            if_none_match is None
+            and if_modified_since is not None
+            and known_collection(request.url.path)
+            and not_modified_since(modified, if_modified_since)
+        ):
+            await Response(status_code=304, headers=validators)(scope, receive, send)
+            return
+
+        async def send_with_validators(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(raw=message["headers"])
+                for k, v in validators.items():
+                    if k == "Vary":
+                        headers.add_vary_header(v)
+                    elif k not in headers:
+                        headers[k] = v
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
@@ -1,17 +1,25 @@
 import logging
-import uuid
+import time
 
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
 
+from utils.store import queue_time
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+
+class LoggingMiddleware:
     def __init__(self, app):
-        super().__init__(app)
+        self.app = app
         self.logger = logging.getLogger()
 
-    async def dispatch(self, request, call_next):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Log the request
+        request = Request(scope)
         req_uuid = request.state.correlation_id
+        start = time.perf_counter()
         self.logger.info(
             "Request",
             extra={
@@ -22,18 +30,29 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             },
         )
 
-        # Next middleware
-        response = await call_next(request)
+        status_code = 500
+        # the time the request's queries spend queued for the store, see StoreLimiter
+        waited = [0.0]
+        queue_time.set(waited)
 
-        # Log the response
-        self.logger.info(
-            "Response sent",
-            extra={
-                "uuid": req_uuid,
-                "type": "api-response",
-                "code": response.status_code,
-            },
-        )
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-        # Return response
-        return response
+        # Next middleware, the body streams straight through
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Log the response once it has been sent in full
+            self.logger.info(
+                "Response sent",
+                extra={
+                    "uuid": req_uuid,
+                    "type": "api-response",
+                    "code": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    "store_queue_ms": round(waited[0] * 1000, 3),
+                },
+            )
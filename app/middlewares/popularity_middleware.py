@@ -0,0 +1,42 @@
+from starlette.requests import Request
+
+from api.conneg import negotiate
+from middlewares.backpressure_middleware import request_priority
+from utils.store import INTERACTIVE, WARM, query_priority
+from utils.warmer import Popularity
+
+
+class PopularityMiddleware:
+    def __init__(self, app, popularity: Popularity):
+        self.app = app
+        self.popularity = popularity
+
+    # Count the requests for each page in each negotiated Media Type answered with it (200, or 304 to a revalidation),
+    # for the cache warmer to warm the most asked for. Exports and the cache warmer's own requests aren't counted.
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or query_priority.get() == WARM
+            or request_priority(scope) != INTERACTIVE
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        renderer = negotiate(request)
+        if renderer is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_with_status)
+        if status_code in (200, 304):
+            self.popularity.record(str(request.url), renderer.mediatype)
@@ -0,0 +1,52 @@
+import logging
+import random
+import uuid
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils.profiling import PROFILE_KEY, Profile, ProfileStore, current_profile, token_matches
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self, app, store: ProfileStore, sample_rate: float = 0.0, interval: float = 0.001, token: Optional[str] = None
+    ):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.token = token
+
+    # Profile requests sent with an x-profile header holding the profiling token (if one is configured), and a sample
+    # of all others, storing each profile under the request's correlation id (returned in the x-profile header of the
+    # response)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (
+            not token_matches(Headers(scope=scope).get("x-profile"), self.token)
+            and random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        correlation_id = scope.get("state", {}).get("correlation_id")
+        if correlation_id is None or PROFILE_KEY.match(correlation_id) is None:
+            correlation_id = str(uuid.uuid4())
+        profile = Profile(self.interval)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])["x-profile"] = correlation_id
+            await send(message)
+
+        token = current_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            current_profile.reset(token)
+            try:
+                self.store.save(correlation_id, profile.folded())
+            except OSError as e:
+                logging.error(f"Unable to store profile {correlation_id}: {e}")
@@ -0,0 +1,29 @@
+from starlette.responses import PlainTextResponse
+
+from utils import utils
+
+# paths served without the data, so available while it is still loading
+UNGUARDED_PATHS = ("/health/", "/static/", "/docs", "/spec", "/openapi.json")
+
+
+class ReadinessMiddleware:
+    def __init__(self, app, retry_after: int = 5):
+        self.app = app
+        self.retry_after = retry_after
+
+    # Answer 503 Service Unavailable for the data while it is loading at startup, rather than failing on it
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or utils.ready.is_set()
+            or scope["path"].startswith(UNGUARDED_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        response = PlainTextResponse(
+            "The API is starting up, please try again shortly",
+            status_code=503,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+        await response(scope, receive, send)
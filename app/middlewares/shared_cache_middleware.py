@@ -0,0 +1,80 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from api.conneg import negotiate
+from middlewares.conditional_get_middleware import make_etag
+from utils import utils
+from utils.redis_cache import TieredCache
+
+
+class SharedCacheMiddleware:
+    def __init__(self, app, cache: TieredCache):
+        self.app = app
+        self.cache = cache
+
+    # Answer content negotiated requests from the cache shared by the workers, caching what is rendered on a miss. The
+    # ETag identifies a response (data version, path, query & negotiated profile/mediatype/language), the base URL is
+    # added as HTML pages link to the API by absolute URL. Responses already content encoded aren't cached, the key not
+    # including the Accept-Encoding they were encoded for. The cache is read and written off the event loop, as its
+    # tiers may be across the network.
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or utils.dataset_version is None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        renderer = negotiate(request)
+        if renderer is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = "{} {}".format(make_etag(request, renderer), request.base_url)
+        cached = await run_in_threadpool(self.cache.get, key)
+        if cached is not None:
+            status, headers, body = cached
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start = {}
+        chunks = []
+        size = 0
+
+        async def send_and_cache(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                # a copy, as the middlewares outside this one add to the headers in place
+                start["status"] = message["status"]
+                start["headers"] = list(message["headers"])
+                if any(k.lower() == b"content-encoding" for k, _ in start["headers"]):
+                    # encoded for this client (a precompressed snapshot), which the key doesn't tell apart
+                    start["status"] = None
+            elif message["type"] == "http.response.body" and start.get("status") == 200:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if size > self.cache.max_entry_bytes:
+                    chunks.clear()
+                    start["status"] = None  # too big to cache
+                elif not message.get("more_body", False):
+                    await send(message)
+                    await run_in_threadpool(
+                        self.cache.set,
+                        key,
+                        200,
+                        [(k.decode("latin-1"), v.decode("latin-1")) for k, v in start["headers"]],
+                        b"".join(chunks),
+                    )
+                    return
+            await send(message)
+
+        await self.app(scope, receive, send_and_cache)
@@ -0,0 +1,44 @@
+from starlette.requests import Request
+from starlette.responses import FileResponse
+
+from api.conneg import negotiate
+from utils import utils
+from utils.snapshot import find_snapshot
+
+
+class SnapshotMiddleware:
+    def __init__(self, app, directory):
+        self.app = app
+        self.directory = directory
+
+    # Serve pre-rendered pages from a snapshot directory, falling back to live rendering, only those made from the data
+    # loaded, as they are given its ETag & Last-Modified
+    async def __call__(self, scope, receive, send):
+
+        if scope["type"] == "http" and scope["method"] == "GET":
+            request = Request(scope)
+            renderer = negotiate(request)
+            if renderer is not None:
+                snapshot = find_snapshot(
+                    self.directory,
+                    request,
+                    renderer.profile,
+                    renderer.mediatype,
+                    utils.version_for(request.url.path)[0],
+                )
+                if snapshot is not None:
+                    file, recorded_headers, encoding = snapshot
+                    headers = {k.lower(): v for k, v in renderer.headers.items()}
+                    headers.update(recorded_headers)
+                    headers.pop("content-type", None)
+                    headers["vary"] = "Accept-Encoding"
+                    if encoding is not None:
+                        headers["content-encoding"] = encoding
+                    response = FileResponse(
+                        file, media_type=renderer.mediatype, headers=headers
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        # Next middleware
+        await self.app(scope, receive, send)
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.requests import Request
+
+from api.conneg import negotiate
+
+
+class StaleResponses:
+    """The last good response to each content negotiated request, least recently used dropped beyond max_bytes"""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[list, bytes, float]]:
+        """The headers & body of the last good response, and when it was stored, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, headers: list, body: bytes) -> None:
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self._entries[key] = headers, body, time.monotonic()
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self.size -= len(self._entries.popitem(last=False)[1][1])
+
+
+class StaleIfErrorMiddleware:
+    def __init__(self, app, max_bytes: int, max_entry_bytes: int):
+        self.app = app
+        self.responses = StaleResponses(max_bytes, max_entry_bytes)
+
+    # Keep the last good response to each content negotiated request and, should the data not be available for one
+    # (a 5xx response, e.g. the store's circuit breaker is open, or an error), answer with that instead, marked stale.
+    # The key doesn't include the data version, the point being to serve what was rendered from earlier data. Responses
+    # already content encoded aren't kept, the key not including the Accept-Encoding they were encoded for.
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        renderer = negotiate(request)
+        if renderer is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = "|".join(
+            [
+                str(request.base_url),
+                request.url.path,
+                request.url.query,
+                renderer.profile,
+                renderer.mediatype,
+                renderer.language,
+            ]
+        )
+        start = {}
+        chunks = []
+        size = 0
+        replaced = False
+
+        async def send_stale(stale):
+            headers, body, stored = stale
+            headers = [(k, v) for k, v in headers if k.lower() not in (b"cache-control", b"content-length")]
+            headers += [
+                (b"cache-control", b"max-age=0, must-revalidate"),
+                (b"warning", b'110 - "Response is Stale"'),
+                (b"age", str(int(time.monotonic() - stored)).encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ]
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        async def send_or_replace(message):
+            nonlocal size, replaced
+            if replaced:
+                return  # the error's body, replaced by the stale response
+            if message["type"] == "http.response.start":
+                start["status"] = message["status"]
+                start["headers"] = list(message["headers"])
+                if any(k.lower() == b"content-encoding" for k, _ in start["headers"]):
+                    # encoded for this client (a precompressed snapshot), which the key doesn't tell apart
+                    start["status"] = None
+                if message["status"] >= 500:
+                    stale = self.responses.get(key)
+                    if stale is not None:
+                        logging.warning(f"Answering {request.url.path} with a stale response, {message['status']}")
+                        replaced = True
+                        await send_stale(stale)
+                        return
+            elif message["type"] == "http.response.body" and start.get("status") == 200:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if size > self.responses.max_entry_bytes:
+                    chunks.clear()
+                    start["status"] = None  # too big to keep
+                elif not message.get("more_body", False):
+                    self.responses.set(key, start["headers"], b"".join(chunks))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_or_replace)
+        except Exception as e:
+            stale = self.responses.get(key)
+            if start or stale is None:
+                raise
+            logging.error(f"Answering {request.url.path} with a stale response, {e!r}")
+            await send_stale(stale)
@@ -4,17 +4,15 @@ import fastapi
 import logging
 from fastapi import Request, Response, HTTPException
 
-from rdflib import Literal
-from rdflib.namespace import DCTERMS, XSD
-
 from api.collections import CollectionsRenderer
-from api.collection import CollectionRenderer
+from api.collection import CollectionRenderer, get_collection_uri
 from api.features import FeaturesRenderer
 from api.feature import FeatureRenderer
 from utils import utils
+from utils.profiling import ProfilingRoute
 
 
-router = fastapi.APIRouter()
+router = fastapi.APIRouter(route_class=ProfilingRoute)
 g = utils.g
 
 
@@ -40,8 +38,10 @@ def collection(
     try:
         logging.info(f"Collections Render request: {request.path_params}")
         return CollectionsRenderer(request).render()
+    except HTTPException:
+        raise
     except Exception as e:
-        return HTTPException(detail=e, status_code=500)
+        raise HTTPException(detail=str(e), status_code=500)
 
 
 @router.get(
@@ -61,11 +61,7 @@ def collection_id(
 
     # get the URI for the Collection using the ID
     logging.info(f"Collection ID request: {request.path_params}")
-    collection_uri = None
-    for s in g.subjects(
-        predicate=DCTERMS.identifier, object=Literal(collection_id, datatype=XSD.token)
-    ):
-        collection_uri = s
+    collection_uri = get_collection_uri(collection_id)
 
     if collection_uri is None:
         return Response(
@@ -75,8 +71,10 @@ def collection_id(
         )
     try:
         return CollectionRenderer(request, collection_uri).render()
+    except HTTPException:
+        raise
     except Exception as e:
-        return HTTPException(detail=e, status_code=500)
+        raise HTTPException(detail=str(e), status_code=500)
 
 
 @router.get(
@@ -94,10 +92,17 @@ def collection_id_items(
     per_page: Optional[str] = None,
     limit: Optional[str] = None,
     bbox: Optional[str] = None,
+    all: Optional[str] = None,
     _profile: Optional[str] = None,
     _mediatype: Optional[str] = None,
 ):
     logging.info(f"Collection ID Item request: {request.path_params}")
+    if get_collection_uri(collection_id) is None:
+        return Response(
+            "You have entered an unknown Collection ID",
+            status_code=400,
+            media_type="text/plain",
+        )
     return FeaturesRenderer(request, collection_id).render()
 
 
@@ -119,11 +124,7 @@ def collection_id_items_id(
 
     # get the URI for the Collection using the ID
     logging.info(f"Collection ID Item ID request: {request.path_params}")
-    collection_uri = None
-    for s in g.subjects(
-        predicate=DCTERMS.identifier, object=Literal(collection_id, datatype=XSD.token)
-    ):
-        collection_uri = s
+    collection_uri = get_collection_uri(collection_id)
 
     if collection_uri is None:
         return Response(
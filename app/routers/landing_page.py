@@ -3,12 +3,11 @@ from typing import Optional
 import fastapi
 import logging
 from fastapi import Request, HTTPException
-from fastapi.templating import Jinja2Templates
 
 from api.landing_page import LandingPageRenderer
+from utils.profiling import ProfilingRoute
 
-router = fastapi.APIRouter()
-templates = Jinja2Templates(directory="templates")
+router = fastapi.APIRouter(route_class=ProfilingRoute)
 
 
 @router.get(
@@ -31,5 +30,7 @@ async def home(
         logging.info(f"Landing page request: {request.path_params}")
         render_content = LandingPageRenderer(request).render()
         return render_content
+    except HTTPException:
+        raise
     except Exception as e:
-        return HTTPException(detail=e, status_code=500)
+        raise HTTPException(detail=str(e), status_code=500)
@@ -0,0 +1,51 @@
+from typing import Optional
+
+import fastapi
+from fastapi import Depends, Header, HTTPException
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+
+from utils.profiling import ProfileStore, token_matches
+
+# set by app.py when profiling is enabled
+store: ProfileStore = None
+token: Optional[str] = None
+
+
+def authorise(authorization: Optional[str] = Header(None)):
+    """Only lets requests bearing the profiling token see the profiles, which hold the API's internals"""
+    scheme, _, given = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token_matches(given, token):
+        raise HTTPException(
+            status_code=401, detail="The profiling token is required", headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+router = fastapi.APIRouter(dependencies=[Depends(authorise)])
+
+
+@router.get(
+    "/profiles",
+    summary="Stored Request Profiles",
+    responses={
+        200: {"description": "The correlation ids of the stored profiles, newest first."},
+        401: {"description": "The profiling token wasn't given."},
+    },
+)
+def profiles():
+    return ORJSONResponse({"profiles": store.keys()})
+
+
+@router.get(
+    "/profiles/{correlation_id}",
+    summary="Request Profile",
+    responses={
+        200: {"description": "The profile of a request, as folded stacks for flame graph tools."},
+        401: {"description": "The profiling token wasn't given."},
+        404: {"description": "No profile is stored for the correlation id."},
+    },
+)
+def profile(correlation_id: str):
+    folded = store.get(correlation_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail=f"No profile for {correlation_id}")
+    return PlainTextResponse(folded)
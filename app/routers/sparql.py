@@ -6,16 +6,18 @@ import logging
 import requests
 from urllib.parse import unquote, parse_qs
 from fastapi import Request, HTTPException
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import Response, RedirectResponse
 from pyldapi import Renderer, RDF_MEDIATYPES
 from rdflib import Graph
+from starlette.concurrency import run_in_threadpool
 
 from api.sparql import SparqlRenderer
 from config import *
+from utils import utils
+from utils.profiling import ProfilingRoute
+from utils.store import PROXY
 
-router = fastapi.APIRouter()
-templates = Jinja2Templates(directory="templates")
+router = fastapi.APIRouter(route_class=ProfilingRoute)
 
 def _best_match(types: List[str], accept: str, default: Optional[str] = None) -> str:
     """Emulates the behaviour of Flask's best_match() method"""
@@ -90,8 +92,10 @@ async def sparql(
             logging.info(f"Sparql page request: {request.path_params}")
             render_content = SparqlRenderer(request).render()
             return render_content
+    except HTTPException:
+        raise
     except Exception as e:
-        return HTTPException(detail=e, status_code=500)
+        raise HTTPException(detail=str(e), status_code=500)
 
 @router.get(
     "/endpoint",
@@ -176,14 +180,24 @@ async def endpoint(
                 )
             )
             
-            if auth is not None:
-                r = requests.post(
-                    SPARQL_ENDPOINT, auth=auth, data=data, headers=headers, timeout=60
-                )
-            else:
-                r = requests.post(
-                    SPARQL_ENDPOINT, data=data, headers=headers, timeout=60
-                )
+            # queries passed on wait behind the API's own for the store, and are refused while it is failing, but have a
+            # breaker of their own, so that they can't open the one the pages go through
+            utils.store_breaker.check()
+            try:
+                with utils.store_limiter.slot(PROXY), utils.proxy_breaker.guard():
+                    if auth is not None:
+                        r = requests.post(
+                            SPARQL_ENDPOINT, auth=auth, data=data, headers=headers, timeout=STORE_TIMEOUT
+                        )
+                    else:
+                        r = requests.post(
+                            SPARQL_ENDPOINT, data=data, headers=headers, timeout=STORE_TIMEOUT
+                        )
+                    # the endpoint failing counts against the breaker, a query it can't answer (4xx) doesn't
+                    if r.status_code >= 500:
+                        raise requests.HTTPError(f"SPARQL endpoint error {r.status_code}", response=r)
+            except requests.HTTPError as e:
+                r = e.response  # passed on as it was before
             
             logging.debug("response: {}".format(r.__dict__))
             return r.content.decode("utf-8")
@@ -247,15 +261,15 @@ async def endpoint(
             if "CONSTRUCT" in query:
                 format_mimetype = "text/turtle"
                 return Response(
-                    sparql_query2(
-                        query, media_type=format_mimetype
+                    await run_in_threadpool(
+                        sparql_query2, query, media_type=format_mimetype
                     ),
                     status_code=200,
                     media_type=format_mimetype,
                 )
             else:
                 return Response(
-                    sparql_query2(query, format_mimetype),
+                    await run_in_threadpool(sparql_query2, query, format_mimetype),
                     status_code=200,
                 )
         except ValueError as e:
@@ -282,8 +296,8 @@ async def endpoint(
             if "CONSTRUCT" in query:
                 acceptable_mimes = [x for x in RDF_MEDIATYPES]
                 best = _best_match(acceptable_mimes, request.headers["accept"])
-                query_result = sparql_query2(
-                    query, media_type=best
+                query_result = await run_in_threadpool(
+                    sparql_query2, query, media_type=best
                 )
                 file_ext = {
                     "text/turtle": "ttl",
@@ -303,7 +317,7 @@ async def endpoint(
                     },
                 )
             else:
-                query_result = sparql_query2(query)
+                query_result = await run_in_threadpool(sparql_query2, query)
                 return Response(
                     query_result, status_code=200, media_type="application/sparql-results+json"
                 )
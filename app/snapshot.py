@@ -0,0 +1,116 @@
+"""
+Pre-renders every page of this API into a static snapshot directory.
+
+    python snapshot.py --out /srv/ogcldapi-snapshot --workers 8
+
+The landing page, conformance page, every collection and every feature (and all pages of the collection & items
+listings) are rendered in each profile & Media Type they offer, in parallel across a pool of processes. Serve the
+result by setting SNAPSHOT_DIR for the API, which answers from the snapshot and renders anything not in it live, or
+publish the directory via a CDN.
+
+Each snapshot records the version of the data it was made from, and is only served while that version is loaded, so
+re-run this whenever the data is reloaded.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+# never answer the generator's own requests from an earlier snapshot
+SNAPSHOT_OUT = os.environ.pop("SNAPSHOT_DIR", None)
+
+import httpx
+
+from config import *
+from api.conneg import ROUTES
+from utils import snapshot
+from utils.sparql_queries import collection_identifiers_sparql, feature_identifiers_sparql
+
+
+def resources():
+    """Yields (path, page) for every page of the API"""
+    from utils import utils
+
+    yield "/", 1
+    yield "/conformance", 1
+
+    collections = [
+        (str(r["fc"]), str(r["identifier"]))
+        for r in utils.g.query(collection_identifiers_sparql.substitute())
+    ]
+    for page in range(1, max(math.ceil(len(collections) / snapshot.DEFAULT_PER_PAGE), 1) + 1):
+        yield "/collections", page
+
+    for collection_uri, collection_id in collections:
+        yield f"/collections/{collection_id}", 1
+
+        features = [
+            str(r["identifier"])
+            for r in utils.g.query(feature_identifiers_sparql.substitute({"URI": collection_uri}))
+        ]
+        for page in range(1, max(math.ceil(len(features) / snapshot.DEFAULT_PER_PAGE), 1) + 1):
+            yield f"/collections/{collection_id}/items", page
+        for feature_id in features:
+            yield f"/collections/{collection_id}/items/{feature_id}", 1
+
+
+async def _render_resource(out: str, path: str, page: int) -> int:
+    import app
+    from utils import utils
+
+    profiles = next(profiles for pattern, profiles, _, _ in ROUTES if pattern.match(path))
+    directory = snapshot.snapshot_dir(out, path, {"page": str(page)})
+    url = "/".join(quote(segment, safe="") for segment in path.split("/"))
+
+    written = 0
+    transport = httpx.ASGITransport(app=app.api, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url=LANDING_PAGE_URL, headers={"Accept-Encoding": "identity"}
+    ) as client:
+        for token, profile in profiles.items():
+            for mediatype in profile.mediatypes:
+                file = snapshot.snapshot_file(directory, token, mediatype)
+                if file is None:
+                    continue
+                params = {"_profile": token, "_mediatype": mediatype}
+                if page > 1:
+                    params["page"] = page
+                r = await client.get(url, params=params)
+                if r.status_code != 200:
+                    logging.warning(f"Not snapshotting {path} page {page} as {token} {mediatype}: {r.status_code}")
+                    continue
+                snapshot.write_snapshot(file, r.content, r.headers, utils.version_for(path)[0])
+                written += 1
+    return written
+
+
+def render_resource(task) -> int:
+    """Renders every profile & Media Type of one page to the snapshot directory, returning the number of files"""
+    return asyncio.run(_render_resource(*task))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render this API into a static snapshot directory")
+    parser.add_argument("--out", default=SNAPSHOT_OUT or "snapshot", help="directory to write the snapshot to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of rendering processes")
+    args = parser.parse_args()
+
+    # load the data once, before the pool forks, so every worker starts with it
+    import app
+
+    app.load_data()
+
+    out = os.path.realpath(args.out)
+    tasks = [(out, path, page) for path, page in resources()]
+    logging.info(f"Snapshotting {len(tasks)} pages into {out}")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        written = sum(executor.map(render_resource, tasks, chunksize=16))
+    logging.info(f"Snapshot complete, {written} files written")
+
+
+if __name__ == "__main__":
+    main()
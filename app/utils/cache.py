@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from typing import Optional
+import threading
+
+
+class BodyCache:
+    """Response bodies rendered from data that is replaced rather than changed, each rendered once on first use
+
+    Given a maxsize, at most that many bodies are kept, the least recently used dropped (to be rendered again if need
+    be), for bodies keyed by something a client chooses, such as the base URL (Host) the API is reached on.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None):
+        self.maxsize = maxsize
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        body = self._bodies.get(key)
+        if body is None:
+            with self._lock:
+                body = self._bodies.get(key)
+                if body is None:
+                    body = render()
+                    self._bodies[key] = body
+                    if self.maxsize is not None and len(self._bodies) > self.maxsize:
+                        self._bodies.popitem(last=False)
+        elif self.maxsize is not None:
+            with self._lock:
+                if key in self._bodies:
+                    self._bodies.move_to_end(key)
+        return body
+
+
+class LRUCache:
+    """A thread safe mapping holding at most maxsize items, evicting the least recently used"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return default
+            return self._items[key]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,75 @@
+import hashlib
+import logging
+from typing import Dict, Optional, Set
+
+from utils.sparql_queries import (
+    collection_fingerprints_sparql,
+    dataset_fingerprint_sparql,
+    prefixes_fingerprint_sparql,
+)
+
+
+class Fingerprint:
+    """Aggregates of the data that change when it does, per collection and for the data outside of the collections
+
+    Each collection's fingerprint is the number of triples of the collection, its features and their blank nodes, the
+    total length of their objects and their latest dcterms:modified. Comparing the fingerprints taken before and after
+    a reload tells which collections changed, so only what is held for those has to be dropped. An edit that changes
+    none of these (a value replaced by another of the same length, without touching dcterms:modified) goes unnoticed,
+    for which there is the full reload.
+    """
+
+    __slots__ = ("collections", "rest")
+
+    def __init__(self, collections: Dict[str, tuple], rest: tuple):
+        self.collections = collections
+        self.rest = rest
+
+    def changes(self, current: "Fingerprint") -> Optional[Set[str]]:
+        """The identifiers of the collections changed, added or removed since this fingerprint, or None if any data
+        outside of the collections has changed too (so everything must be reloaded)"""
+        if current.rest != self.rest:
+            return None
+        return {
+            identifier
+            for identifier in self.collections.keys() | current.collections.keys()
+            if self.collections.get(identifier) != current.collections.get(identifier)
+        }
+
+    def digest(self, identifier: str = None) -> str:
+        """A short hash of a collection's fingerprint, or of the whole fingerprint"""
+        if identifier is not None:
+            value = repr(self.collections[identifier])
+        else:
+            value = repr((sorted(self.collections.items()), self.rest))
+        return hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+
+
+def fingerprint(graph) -> Fingerprint:
+    """Fingerprints the data in a store, see Fingerprint"""
+    collections = {}
+    for r in graph.query(collection_fingerprints_sparql):
+        collections[str(r["identifier"])] = (int(r["triples"]), int(r["length"] or 0), str(r["modified"] or ""))
+
+    total = list(graph.query(dataset_fingerprint_sparql))[0]
+    try:
+        prefixes = int(list(graph.query(prefixes_fingerprint_sparql))[0]["triples"])
+    except Exception as e:
+        logging.info(f"No preferred prefixes graph to fingerprint. {e}")
+        prefixes = None
+
+    # what isn't in any collection, features being in just the one
+    rest = (
+        int(total["triples"]) - sum(c[0] for c in collections.values()),
+        int(total["length"] or 0) - sum(c[1] for c in collections.values()),
+        prefixes,
+    )
+    return Fingerprint(collections, rest)
+
+
+def collection_from_path(path: str) -> Optional[str]:
+    """The identifier of the collection a path is for (the collection itself, its items or an item), if any"""
+    parts = path.split("/", 3)
+    if len(parts) > 2 and parts[1] == "collections" and parts[2]:
+        return parts[2]
+    return None
@@ -0,0 +1,77 @@
+import zlib
+from typing import Optional
+
+from config import COMPRESSION_LEVEL
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+# Content-Encodings this API can produce, most preferred first
+ENCODINGS = (["br"] if brotli is not None else []) + ["gzip"]
+
+# file extensions for precompressed copies of files
+ENCODING_EXTENSIONS = {"br": "br", "gzip": "gz"}
+
+# Media Type prefixes of bodies that are already compressed
+INCOMPRESSIBLE_MEDIATYPES = ("image/", "audio/", "video/", "application/zip", "application/gzip")
+
+# Brotli quality to use for a given zlib-style level (1 fastest - 9 smallest)
+BROTLI_QUALITY = {1: 1, 2: 2, 3: 3, 4: 4, 5: 4, 6: 5, 7: 6, 8: 8, 9: 11}
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Picks the Content-Encoding to use for a response from a request's Accept-Encoding header, if any"""
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    return not content_type.startswith(INCOMPRESSIBLE_MEDIATYPES)
+
+
+def compress(body: bytes, encoding: str, level: int = COMPRESSION_LEVEL) -> bytes:
+    """Compresses a whole body"""
+    compressor = StreamCompressor(encoding, level)
+    return compressor.compress(body) + compressor.flush()
+
+
+class StreamCompressor:
+    """Compresses a body chunk by chunk, for streamed responses"""
+
+    def __init__(self, encoding: str, level: int = COMPRESSION_LEVEL):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY[level])
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk)
+        return self._compressor.compress(chunk)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
@@ -0,0 +1,53 @@
+import re
+from typing import Dict
+
+from rdflib.namespace import OWL, RDF, RDFS, XSD
+
+# prefixes every rdflib Graph binds, so were always available to tooltips
+CORE_PREFIXES = {"owl": OWL, "rdf": RDF, "rdfs": RDFS, "xsd": XSD}
+
+# local names that can follow a prefix, anything else is displayed as a full <IRI>
+LOCAL_NAME = re.compile(r"^[A-Za-z_][\w.\-]*$")
+
+
+class PrefixTrie:
+    """Maps IRIs to CURIEs (prefix:local) by longest matching namespace, walking each IRI once, a character at a time"""
+
+    # key of a trie node holding the prefix of the namespace ending at that node
+    PREFIX = None
+
+    def __init__(self, prefixes: Dict[str, str]):
+        self.root = {}
+        # when several prefixes are given for a namespace, the alphabetically first is used
+        for prefix, namespace in sorted(prefixes.items(), reverse=True):
+            node = self.root
+            for c in str(namespace):
+                node = node.setdefault(c, {})
+            node[self.PREFIX] = prefix
+
+    def curie(self, iri: str) -> str:
+        node = self.root
+        prefix, end = None, 0
+        for i, c in enumerate(iri):
+            node = node.get(c)
+            if node is None:
+                break
+            if self.PREFIX in node:
+                prefix, end = node[self.PREFIX], i + 1
+        if prefix is not None and LOCAL_NAME.match(iri[end:]):
+            return f"{prefix}:{iri[end:]}"
+        return f"<{iri}>"
+
+
+trie = PrefixTrie(CORE_PREFIXES)
+
+
+def load_prefixes(prefixes: Dict[str, str]) -> None:
+    """Rebuilds the trie from the API's preferred prefixes along with the core ones"""
+    global trie
+    trie = PrefixTrie({**CORE_PREFIXES, **prefixes})
+
+
+def curie(iri: str) -> str:
+    """Returns the CURIE of an IRI, e.g. "skos:prefLabel", or the IRI as <IRI> if no prefix's namespace matches it"""
+    return trie.curie(iri)
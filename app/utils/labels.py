@@ -0,0 +1,66 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rdflib import Literal, URIRef
+
+from config import LABEL_CACHE_SIZE
+from utils import utils
+from utils.cache import LRUCache
+from utils.rows import Row
+from utils.sparql_queries import labels_sparql
+
+# URIs per VALUES query, keeping queries for very large pages to a sensible length
+BATCH_SIZE = 500
+
+# URI -> label, or None for URIs known to have no label. Cleared whenever the data is (re)loaded
+cache = LRUCache(LABEL_CACHE_SIZE)
+
+_MISSING = object()
+
+
+def get_labels(uris: Iterable[URIRef]) -> Dict[URIRef, Optional[Literal]]:
+    """Returns the labels of URIs, querying the store in bulk only for those not already cached"""
+    labels = {}
+    unseen = []
+    for uri in uris:
+        if uri in labels:
+            continue
+        label = cache.get(uri, _MISSING)
+        if label is _MISSING:
+            unseen.append(uri)
+            labels[uri] = None
+        else:
+            labels[uri] = label
+
+    for i in range(0, len(unseen), BATCH_SIZE):
+        batch = unseen[i:i + BATCH_SIZE]
+        query = labels_sparql.substitute({"URIS": " ".join(uri.n3() for uri in batch)})
+        for r in utils.g.query(query):
+            if labels[r["uri"]] is None:
+                labels[r["uri"]] = r["label"]
+        for uri in batch:
+            cache.set(uri, labels[uri])
+
+    return labels
+
+
+def add_labels(*groups: Tuple[List[Row], List[str]]) -> None:
+    """Adds a {variable}Label to each result row, for each of the variables bound to a URI that has a label
+
+    Given groups of rows, each with the variables to label in them, so that the labels of a page are looked up together.
+    The rows are left as they would be had the query joined the labels with OPTIONAL {?x rdfs:label ?xLabel}.
+    """
+    labels = get_labels(
+        getattr(r, v)
+        for rows, variables in groups
+        for r in rows
+        for v in variables
+        if isinstance(getattr(r, v), URIRef)
+    )
+    for rows, variables in groups:
+        for r in rows:
+            for v in variables:
+                value = getattr(r, v)
+                if isinstance(value, URIRef):
+                    label = labels[value]
+                    if label is not None:
+                        setattr(r, f"{v}Label", label)
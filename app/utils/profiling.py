@@ -0,0 +1,163 @@
+import asyncio
+import functools
+import hmac
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from fastapi.routing import APIRoute
+
+# the Profile of the request being handled, if it is being profiled
+current_profile = ContextVar("current_profile", default=None)
+
+# keys profiles may be stored under, so a correlation id given in a request header can't name a path
+PROFILE_KEY = re.compile(r"^[A-Za-z0-9_\-]{1,128}$")
+
+
+def token_matches(given: Optional[str], token: Optional[str]) -> bool:
+    """Whether a token given in a request is the configured one, there being none if not configured"""
+    return given is not None and token is not None and hmac.compare_digest(given.encode(), token.encode())
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace("\\", "/").split("/")
+    return "{} ({}:{})".format(code.co_name, "/".join(path[-2:]), code.co_firstlineno)
+
+
+class Profile:
+    """Samples the stacks of the threads handling one request, as folded stacks ("a;b;c count") for flame graphs
+
+    A thread is only sampled while it is running the request's endpoint, see ProfilingRoute. Sync endpoints run on a
+    thread of their own, so their samples are of that request only, async endpoints share the event loop's thread with
+    any other requests being handled at the time.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.threads = set()
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sampler.join()
+
+    @contextmanager
+    def thread(self):
+        """Samples the current thread for the duration of the block"""
+        ident = threading.get_ident()
+        self.threads.add(ident)
+        try:
+            yield
+        finally:
+            self.threads.discard(ident)
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join("{} {}\n".format(stack, count) for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """The most recent profiles, by correlation id, as files in a directory (a ring buffer of at most size files)"""
+
+    def __init__(self, directory: str, size: int):
+        self.directory = directory
+        self.size = size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> Optional[str]:
+        if PROFILE_KEY.match(key) is None:
+            return None
+        return os.path.join(self.directory, key + ".folded")
+
+    def save(self, key: str, profile: str) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        with open(path + ".tmp", "w") as f:
+            f.write(profile)
+        os.replace(path + ".tmp", path)
+
+        # drop the oldest profiles
+        with self._lock:
+            for old in self.keys()[self.size:]:
+                try:
+                    os.remove(self._path(old))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def keys(self) -> List[str]:
+        """The keys of the stored profiles, newest first"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".folded"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.name[: -len(".folded")]))
+                except FileNotFoundError:
+                    pass
+        return [key for mtime, key in sorted(entries, reverse=True)]
+
+
+def profiled(endpoint):
+    """Wraps an endpoint so its thread is sampled when the request is being profiled"""
+    if getattr(endpoint, "profiled", False):
+        return endpoint  # e.g. the route being copied by include_router()
+
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def profiled_endpoint(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            with profile.thread():
+                return await endpoint(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(endpoint)
+        def profiled_endpoint(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return endpoint(*args, **kwargs)
+            with profile.thread():
+                return endpoint(*args, **kwargs)
+
+    profiled_endpoint.profiled = True
+    return profiled_endpoint
+
+
+class ProfilingRoute(APIRoute):
+    """A route whose endpoint can be profiled, see ProfilingMiddleware"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
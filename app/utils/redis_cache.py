@@ -0,0 +1,227 @@
+import hashlib
+import logging
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import orjson
+
+
+class RedisError(Exception):
+    """An error reply from the server, or a reply that couldn't be read"""
+
+
+class RedisConnection:
+    """A connection to a Redis (or Redis protocol compatible) server, speaking just enough RESP for RedisCache"""
+
+    def __init__(self, url: str, timeout: float):
+        parsed = urlparse(url)
+        self.sock = socket.create_connection((parsed.hostname or "localhost", parsed.port or 6379), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if parsed.password:
+            if parsed.username:
+                self.command("AUTH", unquote(parsed.username), unquote(parsed.password))
+            else:
+                self.command("AUTH", unquote(parsed.password))
+        db = parsed.path.strip("/")
+        if db:
+            self.command("SELECT", db)
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(parts))
+        return self.read_reply()
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise RedisError("Connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise RedisError("Connection closed")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisCache:
+    """Rendered responses and query results shared by every replica of the API, on a Redis protocol server
+
+    A second tier behind each replica's own caches, so that what any replica has rendered or asked the store is a hit
+    for all of them. Values are zlib compressed and expire after ttl seconds. Keys are namespaced by the version of the
+    data, which the replicas agree through the server (see publish_version() and join_version()), so a reload moves every
+    replica to a fresh namespace and what was cached from earlier data is never served, just left to expire.
+
+    The cache fails open: should the server be unreachable, slow or answer with an error, the error is logged and the
+    cache is bypassed (every get a miss, every set dropped) for retry_seconds before it is tried again, so requests
+    are never failed, nor held up for more than timeout, by the cache.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        prefix: str = "ogcldapi",
+        ttl: int = 86400,
+        timeout: float = 0.5,
+        retry_seconds: float = 30,
+        max_entry_bytes: int = 1024 * 1024,
+        level: int = 6,
+    ):
+        self.url = url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self.level = level
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _command(self, *args):
+        """Sends a command on this thread's connection, returning the reply, or None if the server is unavailable"""
+        if time.monotonic() < self._down_until:
+            return None
+        connection = getattr(self._local, "connection", None)
+        try:
+            if connection is not None:
+                try:
+                    return connection.command(*args)
+                except (OSError, RedisError):
+                    # the connection may just have gone stale (e.g. the server restarted), try once on a new one
+                    connection.close()
+            connection = self._local.connection = RedisConnection(self.url, self.timeout)
+            return connection.command(*args)
+        except (OSError, RedisError, ValueError) as e:
+            if connection is not None:
+                connection.close()
+            self._local.connection = None
+            self._down_until = time.monotonic() + self.retry_seconds
+            logging.error(f"Redis cache unavailable, bypassing it for {self.retry_seconds} seconds: {e}")
+            return None
+
+    def key(self, namespace: str, key: str) -> str:
+        return "{}:{}:{}".format(self.prefix, namespace, hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+    def get_value(self, key: str) -> Optional[bytes]:
+        value = self._command("GET", key)
+        if value is None:
+            return None
+        try:
+            return zlib.decompress(value)
+        except zlib.error:
+            return None
+
+    def set_value(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_entry_bytes:
+            return
+        self._command("SET", key, zlib.compress(value, self.level), "EX", self.ttl)
+
+    # the same interface as SharedCache, for SharedCacheMiddleware, whose keys already hold the data version
+
+    def get(self, key: str) -> Optional[Tuple[int, list, bytes]]:
+        """The status, headers & body stored for a key, or None"""
+        value = self.get_value(self.key("response", key))
+        if value is None:
+            return None
+        head, _, body = value.partition(b"\n")
+        head = orjson.loads(head)
+        return head["status"], head["headers"], body
+
+    def set(self, key: str, status: int, headers: list, body: bytes) -> None:
+        if len(body) > self.max_entry_bytes:
+            return
+        self.set_value(
+            self.key("response", key), orjson.dumps({"status": status, "headers": headers}) + b"\n" + body
+        )
+
+    def _read_version(self) -> Optional[dict]:
+        value = self._command("GET", self.prefix + ":version")
+        return None if value is None else orjson.loads(value)
+
+    def read_version(self) -> Optional[Tuple[str, datetime]]:
+        """The published version (and modification time) of the data, or None if none has been published"""
+        version = self._read_version()
+        if version is None:
+            return None
+        return version["version"], datetime.fromisoformat(version["modified"])
+
+    def _write_version(self, version: str, modified: datetime, digest: Optional[str], *options) -> None:
+        self._command(
+            "SET",
+            self.prefix + ":version",
+            orjson.dumps({"version": version, "modified": modified.isoformat(), "digest": digest}),
+            *options,
+        )
+
+    def publish_version(
+        self, version: str, modified: datetime, digest: Optional[str] = None, clear: bool = True
+    ) -> None:
+        """Makes this the version of the data for all the replicas, whose entries are namespaced by it (so there is
+        nothing to clear), along with the digest of the data's fingerprint, see join_version()"""
+        self._write_version(version, modified, digest)
+
+    def join_version(self, version: str, modified: datetime, digest: Optional[str] = None) -> Tuple[str, datetime]:
+        """Returns the published version of the data, first publishing this one if there is none yet
+
+        Given the digest of the data's fingerprint, this version is also published if the published one is for other
+        data, e.g. the store's data changed while the replicas were down, rather than serving what was cached from that.
+        Falls back to this version if the server is unavailable.
+        """
+        published = self._read_version()
+        if published is not None and (digest is None or published.get("digest") == digest):
+            return published["version"], datetime.fromisoformat(published["modified"])
+        if published is None:
+            self._write_version(version, modified, digest, "NX")
+            return self.read_version() or (version, modified)
+        self._write_version(version, modified, digest)
+        return version, modified
+
+
+class TieredCache:
+    """A cache of rendered responses checked in turn, a hit in a later tier being copied into the earlier ones"""
+
+    def __init__(self, *tiers):
+        self.tiers = tiers
+        self.max_entry_bytes = max(tier.max_entry_bytes for tier in tiers)
+
+    def get(self, key: str) -> Optional[Tuple[int, list, bytes]]:
+        for i, tier in enumerate(self.tiers):
+            cached = tier.get(key)
+            if cached is not None:
+                for earlier in self.tiers[:i]:
+                    earlier.set(key, *cached)
+                return cached
+        return None
+
+    def set(self, key: str, status: int, headers: list, body: bytes) -> None:
+        for tier in self.tiers:
+            tier.set(key, status, headers, body)
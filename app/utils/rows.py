@@ -0,0 +1,84 @@
+from typing import List
+
+from rdflib import URIRef
+
+from utils.curies import curie
+
+
+class Row:
+    """A property query result row, with a slot per variable and per Label & Prefixed value added to it
+
+    Rows are built straight from query results and their Label & Prefixed values filled in place. They can still be
+    read like the dicts they replace, e.g. row["p1"] or row.get(f"{name}Label").
+    """
+
+    __slots__ = ()
+
+    # variables that may be bound to URIs, which get a {variable}Prefixed CURIE
+    TERMS = ()
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    @classmethod
+    def from_result(cls, result) -> List["Row"]:
+        names = [str(v) for v in result.vars]
+        rows = []
+        for values in result:
+            row = cls()
+            for name, value in zip(names, values):
+                setattr(row, name, value)
+            rows.append(row)
+        return rows
+
+    def add_prefixes(self) -> None:
+        for name in self.TERMS:
+            value = getattr(self, name)
+            if isinstance(value, URIRef):
+                setattr(self, f"{name}Prefixed", curie(value))
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+
+class PropertyRow(Row):
+    """?p1 ?o1 (?system_url) - a property of a resource whose object is not a blank node"""
+
+    __slots__ = ("p1", "o1", "system_url", "p1Label", "o1Label", "p1Prefixed", "o1Prefixed")
+    TERMS = ("p1", "o1")
+
+
+class BnodePropertyRow(Row):
+    """?p1 ?p2 ?o2 ?o1 - a property of a blank node (?o1) that is the object of a resource's property"""
+
+    __slots__ = (
+        "p1", "p2", "o2", "o1",
+        "p1Label", "p2Label", "o2Label",
+        "p1Prefixed", "p2Prefixed", "o2Prefixed",
+    )
+    TERMS = ("p1", "p2", "o2")
+
+
+class GeometryRow(Row):
+    """?p1 ?p2 ?o2 - a property of one of a feature's geometry blank nodes, ?o2 being e.g. a WKT literal"""
+
+    __slots__ = (
+        "p1", "p2", "o2",
+        "p1Label", "p2Label", "o2Label",
+        "p1Prefixed", "p2Prefixed", "o2Prefixed",
+    )
+    TERMS = ("p1", "p2", "o2")
+
+
+def add_prefixes(rows: List[Row]) -> None:
+    """Adds the prefixed URIs (e.g. "skos:prefLabel") to rows, for display as tooltips in the UI"""
+    for row in rows:
+        row.add_prefixes()
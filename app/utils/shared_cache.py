@@ -0,0 +1,175 @@
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Tuple
+
+import orjson
+
+
+class SharedCache:
+    """Rendered responses shared by all the worker processes on a host, as files in a directory
+
+    Meant for a tmpfs directory (e.g. under /dev/shm) so entries are held in memory once however many workers there
+    are, and a page rendered by any worker is a hit for all of them. Entries are written atomically (to a temporary file
+    then renamed over), so readers never see a partial entry, and evicted least recently used once the entries exceed
+    max_bytes, by whichever worker gets the eviction lock.
+
+    The directory also holds the version of the loaded data all the workers should be answering with, see
+    publish_version() and join_version(). A reload on any worker publishes a new version and (unless only some
+    collections changed) drops every entry, the others notice the new version and reload too.
+    """
+
+    # sweep for entries to evict once every this many writes (per worker)
+    SWEEP_EVERY = 64
+
+    def __init__(self, directory: str, max_bytes: int, max_entry_bytes: int):
+        self.directory = directory
+        self.entries = os.path.join(directory, "entries")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.entries, exist_ok=True)
+
+    @contextmanager
+    def _locked(self, name: str, blocking: bool = True):
+        """Holds an exclusive lock across the workers, yielding whether it was got (always, if blocking)"""
+        with open(os.path.join(self.directory, name + ".lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.entries, hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+    def get(self, key: str) -> Optional[Tuple[int, list, bytes]]:
+        """The status, headers & body stored for a key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                head = orjson.loads(f.readline())
+                body = f.read()
+            # mark as recently used, for eviction
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return head["status"], head["headers"], body
+
+    def set(self, key: str, status: int, headers: list, body: bytes) -> None:
+        if len(body) > self.max_entry_bytes:
+            return
+        path = self._path(key)
+        temp = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        try:
+            with open(temp, "wb") as f:
+                f.write(orjson.dumps({"status": status, "headers": headers}))
+                f.write(b"\n")
+                f.write(body)
+            os.replace(temp, path)
+        except OSError as e:
+            logging.error(f"Unable to write to the shared cache: {e}")
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % self.SWEEP_EVERY == 0
+        if sweep:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drops the least recently used entries until they are back under 90% of max_bytes"""
+        with self._locked("evict", blocking=False) as locked:
+            if not locked:
+                return  # another worker is already at it
+            entries = []
+            total = 0
+            for entry in os.scandir(self.entries):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self) -> None:
+        # swap in an empty entries directory, then delete the old one at leisure
+        old = "{}.{}.old".format(self.entries, uuid.uuid4().hex)
+        with self._locked("evict"):
+            os.replace(self.entries, old)
+            os.makedirs(self.entries, exist_ok=True)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _read_version(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directory, "version"), "rb") as f:
+                return orjson.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_version(self) -> Optional[Tuple[str, datetime]]:
+        """The published version (and modification time) of the data, or None if none has been published"""
+        version = self._read_version()
+        if version is None:
+            return None
+        return version["version"], datetime.fromisoformat(version["modified"])
+
+    def _write_version(self, version: str, modified: datetime, digest: Optional[str]) -> None:
+        path = os.path.join(self.directory, "version")
+        with open(path + ".tmp", "wb") as f:
+            f.write(orjson.dumps({"version": version, "modified": modified.isoformat(), "digest": digest}))
+        os.replace(path + ".tmp", path)
+
+    def publish_version(
+        self, version: str, modified: datetime, digest: Optional[str] = None, clear: bool = True
+    ) -> None:
+        """Makes this the version of the data for all the workers, dropping every entry rendered from earlier data
+
+        The digest of the data's fingerprint is published with it, see join_version(). A reload of just some
+        collections doesn't clear the entries, the others' still being current.
+        """
+        with self._locked("version"):
+            self._write_version(version, modified, digest)
+        if clear:
+            self.clear()
+
+    def join_version(self, version: str, modified: datetime, digest: Optional[str] = None) -> Tuple[str, datetime]:
+        """Returns the published version of the data, first publishing this one if there is none yet
+
+        Given the digest of the data's fingerprint, this version is also published (and every entry dropped) if the
+        published one is for other data, e.g. the store's data changed while the workers were down.
+        """
+        with self._locked("version"):
+            published = self._read_version()
+            if published is not None and (digest is None or published.get("digest") == digest):
+                return published["version"], datetime.fromisoformat(published["modified"])
+            self._write_version(version, modified, digest)
+        if published is not None:
+            self.clear()
+        return version, modified
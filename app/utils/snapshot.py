@@ -0,0 +1,118 @@
+import json
+import os
+from typing import Optional, Tuple
+
+from config import COMPRESSION_MINIMUM_SIZE
+from utils.compression import ENCODINGS, ENCODING_EXTENSIONS, compress, negotiate_encoding
+
+# file extensions for the Media Types a snapshot holds
+MEDIATYPE_EXTENSIONS = {
+    "text/html": "html",
+    "application/json": "json",
+    "application/geo+json": "geojson",
+    "application/ld+json": "jsonld",
+    "text/turtle": "ttl",
+    "application/rdf+xml": "rdf",
+    "text/n3": "n3",
+    "application/n-triples": "nt",
+}
+
+# query string arguments that are resolved by content negotiation rather than selecting different content
+CONNEG_PARAMS = ["_profile", "_view", "_mediatype", "_format"]
+
+# response headers recorded alongside each snapshot file so it can be served as the live API would serve it
+KEPT_HEADERS = ["link", "content-language", "content-disposition"]
+
+DEFAULT_PER_PAGE = 100
+
+
+def snapshot_dir(root: str, path: str, query_params) -> Optional[str]:
+    """Returns the directory holding the snapshots of a resource, or None if the request can't be served from one
+
+    Only the default page size of paged resources is snapshotted, each page in its own page-N directory.
+    """
+    page = "1"
+    for k, v in query_params.items():
+        if k in CONNEG_PARAMS:
+            continue
+        elif k == "page":
+            page = v
+        elif k == "per_page" and v == str(DEFAULT_PER_PAGE):
+            continue
+        else:
+            return None
+    if not page.isdigit():
+        return None
+
+    directory = os.path.realpath(os.path.join(root, path.strip("/"), f"page-{int(page)}"))
+    if not directory.startswith(os.path.realpath(root) + os.sep):
+        return None
+    return directory
+
+
+def snapshot_file(directory: str, profile: str, mediatype: str) -> Optional[str]:
+    """Returns the file name of a resource's snapshot in a profile & Media Type"""
+    extension = MEDIATYPE_EXTENSIONS.get(mediatype)
+    if extension is None:
+        return None
+    return os.path.join(directory, f"{profile}.{extension}")
+
+
+def find_snapshot(
+    root: str, request, profile: str, mediatype: str, version: str
+) -> Optional[Tuple[str, dict, Optional[str]]]:
+    """Returns the snapshot file for a negotiated request, with its recorded headers, if there is one made from the
+    version of the data given
+
+    If the client accepts a Content-Encoding the snapshot was precompressed with, that copy is returned along with
+    the encoding.
+    """
+    directory = snapshot_dir(root, request.url.path, request.query_params)
+    if directory is None:
+        return None
+    file = snapshot_file(directory, profile, mediatype)
+    if file is None or not os.path.isfile(file):
+        return None
+
+    try:
+        with open(file + ".headers") as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # made from other data (or by a version of this that didn't record it), it would be labelled as current
+    if not isinstance(recorded, dict) or recorded.get("version") != version:
+        return None
+    headers = recorded.get("headers", {})
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        compressed_file = f"{file}.{ENCODING_EXTENSIONS[encoding]}"
+        if os.path.isfile(compressed_file):
+            return compressed_file, headers, encoding
+    return file, headers, None
+
+
+def _write(file: str, content: bytes) -> None:
+    with open(file + ".tmp", "wb") as f:
+        f.write(content)
+    os.replace(file + ".tmp", file)
+
+
+def write_snapshot(file: str, body: bytes, headers: dict, version: str) -> None:
+    """Writes a snapshot file, its recorded headers and the version of the data it was made from, and precompressed
+    copies, replacing any previous snapshot"""
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    for encoding in ENCODINGS:
+        compressed_file = f"{file}.{ENCODING_EXTENSIONS[encoding]}"
+        if len(body) >= COMPRESSION_MINIMUM_SIZE:
+            # compressed once, offline, so use the smallest setting
+            _write(compressed_file, compress(body, encoding, level=9))
+        elif os.path.exists(compressed_file):
+            os.remove(compressed_file)
+    _write(
+        file + ".headers",
+        json.dumps(
+            {"version": version, "headers": {k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS}}
+        ).encode(),
+    )
+    _write(file, body)
@@ -24,4 +24,123 @@ feature_class_label_sparql = Template("""
     order by DESC(?distance)
     LIMIT 1
     }
-    """)
\ No newline at end of file
+    """)
+
+# template queries used to stream an entire collection as N-Triples, one page of features at a time. Each page is a
+# CONSTRUCT of the features' own triples plus the triples of any blank nodes hanging off them (e.g. geo:hasGeometry),
+# so pages can be written out without building an intermediate Graph of the whole collection.
+# Utilised in features.py
+collection_triples_sparql = Template("""
+    CONSTRUCT { <$URI> ?p ?o }
+    WHERE { <$URI> ?p ?o }
+    """)
+
+collection_features_triples_sparql = Template("""
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    CONSTRUCT {
+        ?f ?p1 ?o1 .
+        ?o1 ?p2 ?o2 .
+    }
+    WHERE {
+        {
+            SELECT ?f
+            WHERE { ?f dcterms:isPartOf <$URI> }
+            ORDER BY ?f
+            LIMIT $LIMIT OFFSET $OFFSET
+        }
+        ?f ?p1 ?o1 .
+        OPTIONAL {
+            ?o1 ?p2 ?o2 .
+            FILTER(ISBLANK(?o1))
+        }
+    }
+    """)
+
+
+# queries listing the identifiers of all collections, and of all the features in a collection, in a stable order
+# Utilised in snapshot.py
+collection_identifiers_sparql = Template("""
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    PREFIX geo: <http://www.opengis.net/ont/geosparql#>
+    SELECT ?fc ?identifier
+    WHERE { ?fc a geo:FeatureCollection ;
+                dcterms:identifier ?identifier . }
+    ORDER BY ?identifier
+    """)
+
+feature_identifiers_sparql = Template("""
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    SELECT ?identifier
+    WHERE { ?f dcterms:isPartOf <$URI> ;
+               dcterms:identifier ?identifier . }
+    ORDER BY ?identifier
+    """)
+
+# query for the conformance targets the API declares, with their labels, loaded once per data (re)load
+# Utilised in conformance.py
+conformance_targets_sparql = """
+    PREFIX ogcapi: <https://data.surroundaustralia.com/def/ogcldapi/>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    SELECT ?uri ?title
+    WHERE {
+        ?uri a ogcapi:ConformanceTarget .
+        OPTIONAL { ?uri rdfs:label ?title }
+    }
+    """
+
+# template query for the English (or untagged) labels of a batch of URIs
+# Utilised in labels.py
+labels_sparql = Template("""
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    SELECT ?uri ?label
+    WHERE {
+        VALUES ?uri { $URIS }
+        ?uri rdfs:label ?label .
+        FILTER(lang(?label) = "" || lang(?label) = "en")
+    }
+    """)
+
+# template query for the URI of a collection from its identifier, $ID being an xsd:token literal
+# Utilised in collection.py
+collection_uri_sparql = Template("""
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    SELECT ?collection
+    WHERE { ?collection dcterms:identifier $ID }
+    """)
+
+# queries fingerprinting the data, to tell on a reload which collections have changed: per collection, the number of
+# triples of the collection, its features & their blank nodes, the total length of their (non blank node) objects and
+# the latest dcterms:modified, then the same totals for all the data and the number of preferred prefixes
+# Utilised in changes.py
+collection_fingerprints_sparql = """
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    PREFIX geo: <http://www.opengis.net/ont/geosparql#>
+    SELECT ?identifier (COUNT(*) AS ?triples) (SUM(IF(ISBLANK(?o), 0, STRLEN(STR(?o)))) AS ?length)
+        (MAX(IF(?p = dcterms:modified, STR(?o), "")) AS ?modified)
+    WHERE {
+        ?fc a geo:FeatureCollection ;
+            dcterms:identifier ?identifier .
+        {
+            ?fc ?p ?o .
+        } UNION {
+            ?f dcterms:isPartOf ?fc ;
+                ?p ?o .
+        } UNION {
+            ?f dcterms:isPartOf ?fc ;
+                ?p1 ?b .
+            ?b ?p ?o .
+            FILTER(ISBLANK(?b))
+        }
+    }
+    GROUP BY ?identifier
+    """
+
+dataset_fingerprint_sparql = """
+    SELECT (COUNT(*) AS ?triples) (SUM(IF(ISBLANK(?o), 0, STRLEN(STR(?o)))) AS ?length)
+    WHERE { ?s ?p ?o }
+    """
+
+prefixes_fingerprint_sparql = """
+    SELECT (COUNT(*) AS ?triples)
+    WHERE { GRAPH <https://preferred-prefixes> { ?s ?p ?o } }
+    """
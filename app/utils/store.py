@@ -0,0 +1,392 @@
+import heapq
+import io
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from fastapi import HTTPException
+from rdflib import Graph
+from rdflib.query import Result
+
+# priority classes of store queries, most urgent first: queries for the pages being viewed, then whole collection
+# exports, then queries passed on from the SPARQL endpoint, then those of the cache warmer
+INTERACTIVE, BULK, PROXY, WARM = 0, 1, 2, 3
+PRIORITY_NAMES = ("interactive", "bulk", "proxy", "warm")
+
+# the priority SingleFlightGraph queries the store at, for the request being handled
+query_priority = ContextVar("query_priority", default=INTERACTIVE)
+
+# the seconds the queries of the request being handled have spent queued for the store, if they are being counted
+queue_time = ContextVar("queue_time", default=None)
+
+
+class _Stats:
+    __slots__ = ("queries", "queued", "wait", "max_wait", "rejected")
+
+    def __init__(self):
+        self.queries = 0
+        self.queued = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+        self.rejected = 0
+
+
+class StoreLimiter:
+    """Limits the queries a process has in flight to the store, queueing the rest by priority
+
+    A query gets one of limit slots, waiting for one if there are none free. Freed slots go to the waiting queries in
+    priority order (see INTERACTIVE, BULK, PROXY and WARM), first come first served within a priority, and reserved of
+    the slots are only ever given to INTERACTIVE queries, so a burst of exports or SPARQL endpoint queries (which hold
+    their slots for as long as a client takes to read an export) can't hold up the pages being viewed. Requests aren't
+    queued without bound: busy() says when the queue is too deep to take on another request of a priority, lower
+    priorities being turned away at half the depth. A limit of 0 turns limiting off.
+
+    Queries are made from the threads of the threadpool the endpoints run on, which needs a thread for every query
+    running or queued, see threads_needed(), or requests would wait for a thread instead, unseen by the limiter.
+    """
+
+    def __init__(self, limit: int, max_queue: int, reserved: int = 0):
+        if limit > 0 and max_queue < 2:
+            raise ValueError(f"A queue limit of {max_queue} would turn away every export and SPARQL endpoint query")
+        self.limit = limit
+        self.max_queue = max_queue
+        # slots only INTERACTIVE queries may have, leaving at least one for the others
+        self.reserved = max(min(reserved, limit - 1), 0)
+        self.active = 0
+        # the slots held by queries of the other priorities
+        self.active_other = 0
+        self._waiting = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = [_Stats() for _ in PRIORITY_NAMES]
+
+    def _dispatch(self) -> None:
+        """Hands free slots to the waiting queries, in turn, as far as they may have them"""
+        while self._waiting and self.active < self.limit:
+            priority, _, turn = self._waiting[0]
+            if priority != INTERACTIVE and self.active_other >= self.limit - self.reserved:
+                # none of the waiting queries are INTERACTIVE (they would be first), so none may have a slot
+                return
+            heapq.heappop(self._waiting)
+            self.active += 1
+            if priority != INTERACTIVE:
+                self.active_other += 1
+            turn.set()
+
+    @contextmanager
+    def slot(self, priority: int = INTERACTIVE):
+        """Holds a slot for the duration of the block, waiting for one if need be"""
+        if self.limit <= 0:
+            yield
+            return
+
+        start = time.perf_counter()
+        turn = threading.Event()
+        with self._lock:
+            heapq.heappush(self._waiting, (priority, next(self._order), turn))
+            self._dispatch()
+            queued = not turn.is_set()
+        if queued:
+            turn.wait()
+        self._record(priority, time.perf_counter() - start if queued else None)
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                if priority != INTERACTIVE:
+                    self.active_other -= 1
+                self._dispatch()
+
+    def _record(self, priority: int, wait: float = None) -> None:
+        stats = self._stats[priority]
+        stats.queries += 1
+        if wait is not None:
+            stats.queued += 1
+            stats.wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            waited = queue_time.get()
+            if waited is not None:
+                waited[0] += wait
+
+    def busy(self, priority: int = INTERACTIVE) -> bool:
+        """Whether the queue is too deep to take on a request of a priority, counting it as rejected if so"""
+        if self.limit <= 0:
+            return False
+        depth = self.max_queue if priority == INTERACTIVE else self.max_queue // 2
+        if len(self._waiting) < depth:
+            return False
+        self._stats[priority].rejected += 1
+        return True
+
+    def threads_needed(self) -> int:
+        """The threads needed for the queue to reach max_queue, with limit queries running"""
+        return self.limit + self.max_queue
+
+    def idle(self) -> bool:
+        """Whether there is a slot free to any priority, nothing waiting for one"""
+        return self.limit <= 0 or (
+            self.active < self.limit and self.active_other < self.limit - self.reserved and not self._waiting
+        )
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "reserved": self.reserved,
+            "active": self.active,
+            "waiting": len(self._waiting),
+            "priorities": {
+                name: {
+                    "queries": stats.queries,
+                    "queued": stats.queued,
+                    "mean_wait_ms": round(stats.wait / stats.queued * 1000, 3) if stats.queued else 0.0,
+                    "max_wait_ms": round(stats.max_wait * 1000, 3),
+                    "rejected": stats.rejected,
+                }
+                for name, stats in zip(PRIORITY_NAMES, self._stats)
+            },
+        }
+
+
+class _Call:
+    """A query in flight, which the requests waiting on it are given the outcome of"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class StoreUnavailable(HTTPException):
+    """Raised for a query the CircuitBreaker refuses, answered 503 Service Unavailable"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail="The data store is unavailable, please try again shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class CircuitBreaker:
+    """Stops queries going to a store that is failing or slow, so requests fail fast rather than pile up waiting on it
+
+    Closed, queries go to the store and the outcomes of the last window of them are kept. Once at least min_calls are
+    kept and failure_ratio of them failed, by raising or by taking longer than slow_seconds, the breaker opens: queries
+    are refused with StoreUnavailable, without going to the store, for cooldown seconds. It is then half-open: the next
+    query is let through as a trial, any others still refused, and the breaker closes if the trial succeeds or opens for
+    another cooldown if not.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 10,
+        failure_ratio: float = 0.5,
+        slow_seconds: float = 10,
+        cooldown: float = 30,
+    ):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _admit(self) -> bool:
+        """Lets a query through, returning whether it is the trial, or raises StoreUnavailable"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+        raise StoreUnavailable(max(1, int(remaining + 0.5)))
+
+    def _record(self, trial: bool, ok: bool) -> None:
+        with self._lock:
+            if trial:
+                self._trial = False
+                if ok:
+                    logging.info("Store recovered, closing the circuit breaker")
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            if self.state != self.CLOSED:
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_ratio * len(self._outcomes):
+                logging.error(
+                    f"{failures} of the last {len(self._outcomes)} store queries failed or were slow, "
+                    f"opening the circuit breaker for {self.cooldown} seconds"
+                )
+                self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def check(self) -> None:
+        """Raises StoreUnavailable while the breaker is refusing queries, without letting one through or recording it"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                return
+        raise StoreUnavailable(max(1, int(remaining + 0.5)))
+
+    @contextmanager
+    def guard(self):
+        """Runs the block, a query to the store, if the breaker lets it through, recording how it went"""
+        trial = self._admit()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._record(trial, False)
+            raise
+        except BaseException:
+            # abandoned (e.g. a generator closed), no outcome
+            if trial:
+                with self._lock:
+                    self._trial = False
+            raise
+        self._record(trial, time.perf_counter() - start <= self.slow_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_queries": len(self._outcomes),
+            "recent_failures": self._outcomes.count(False),
+        }
+
+
+class SingleFlightGraph:
+    """Wraps the store Graph so that concurrent identical queries share one call to the store
+
+    The first request for a query text runs it, any others asking for the same text while it is in flight wait for and
+    are given the same Result, so a burst of requests for a popular page (after a reload, say) costs the store one
+    query rather than one per request. A request only waits on a query in flight at its own query_priority or a more
+    urgent one, never one queued behind it (a page being viewed on one the cache warmer is running, say). Nothing is
+    kept once the query returns, this is not a cache itself.
+
+    Given a cache (a RedisCache), results are also kept there under the version of the data, for this and the other
+    replicas of the API to be given rather than querying the store, once version is set to the version agreed by them.
+
+    Given a limiter (a StoreLimiter), queries to the store wait their turn for one of its slots, at the query_priority
+    of the request, and given a breaker (a CircuitBreaker) they are refused while the store is failing.
+
+    Everything other than query() is passed through to the wrapped Graph.
+    """
+
+    def __init__(self, graph, cache=None, limiter: StoreLimiter = None, breaker: CircuitBreaker = None):
+        self.graph = graph
+        self.cache = cache
+        self.limiter = limiter
+        self.breaker = breaker
+        self.version = None
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def query(self, query_object, **kwargs):
+        # only plain query strings are coalesced, bindings etc. would have to be part of the key
+        if kwargs or not isinstance(query_object, str):
+            return self.graph.query(query_object, **kwargs)
+
+        # a query only waits on one in flight at its own priority or a more urgent one, which is as soon or sooner
+        priority = query_priority.get()
+        key = priority, query_object
+        with self._lock:
+            call = next(
+                (self._calls[p, query_object] for p in range(priority + 1) if (p, query_object) in self._calls), None
+            )
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            result = self._cached_query(query_object)
+            call.result = result
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+    def _cached_query(self, query: str):
+        version = self.version
+        if self.cache is None or version is None:
+            return self._query(query)
+
+        key = self.cache.key(version + ":query", query)
+        value = self.cache.get_value(key)
+        if value is not None:
+            return load_result(value)
+        result = self._query(query)
+        self.cache.set_value(key, dump_result(result))
+        return result
+
+    def _query(self, query: str):
+        slot = self.limiter.slot(query_priority.get()) if self.limiter is not None else nullcontext()
+        guard = self.breaker.guard() if self.breaker is not None else nullcontext()
+        with slot, guard:
+            return self._evaluate(query)
+
+    def _evaluate(self, query: str):
+        result = self.graph.query(query)
+        # read SELECT bindings into a list now, a Result still backed by a generator can't be iterated by several
+        # requests at once (and a local Graph is only queried as they are read)
+        if result.type == "SELECT":
+            result.bindings
+        return result
+
+
+def dump_result(result) -> bytes:
+    """A query Result as bytes, SPARQL JSON for SELECT and ASK results and N-Triples for graphs"""
+    if result.type in ("CONSTRUCT", "DESCRIBE"):
+        return result.type.encode() + b"\n" + result.graph.serialize(format="nt", encoding="utf-8")
+    return result.type.encode() + b"\n" + result.serialize(format="json")
+
+
+def load_result(value: bytes):
+    """A query Result from dump_result()"""
+    kind, _, data = value.partition(b"\n")
+    kind = kind.decode()
+    if kind in ("CONSTRUCT", "DESCRIBE"):
+        result = Result(kind)
+        result.graph = Graph().parse(data=data.decode("utf-8"), format="nt")
+        return result
+    return Result.parse(io.BytesIO(data), format="json")
@@ -0,0 +1,53 @@
+import os
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from pyldapi import renderer as pyldapi_renderer
+from pyldapi import renderer_container as pyldapi_renderer_container
+
+from config import FRAGMENT_CACHE_SIZE, TEMPLATE_CACHE_DIR
+from utils import utils
+from utils.cache import LRUCache
+
+# rendered template fragments, keyed by the dataset version they were rendered from
+fragments = LRUCache(FRAGMENT_CACHE_SIZE)
+
+
+class FragmentCacheExtension(Extension):
+    """Adds a {% cache "name", key, ... %}...{% endcache %} tag, rendering its body once per key and dataset version
+
+    Only for fragments that depend on the data alone, never on the request.
+    """
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_cache", [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _cache(self, key, caller):
+        key = (utils.dataset_version, *key)
+        fragment = fragments.get(key)
+        if fragment is None:
+            fragment = caller()
+            fragments.set(key, fragment)
+        return fragment
+
+
+# the one template environment shared by all routers and renderers, with templates compiled to bytecode on disk so
+# they are only compiled once across restarts & worker processes
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+templates = Jinja2Templates(directory="templates")
+templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+templates.env.add_extension(FragmentCacheExtension)
+
+# pyLDAPI renders the alternate profiles and members views from the same templates directory, so must use it too
+pyldapi_renderer.templates = templates
+pyldapi_renderer_container.templates = templates
@@ -1,38 +1,253 @@
+import functools
 import logging
 import pickle
+import socket
+import threading
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Set, Tuple
 
-from config import SPARQL_ENDPOINT, TEST_GRAPH
+import requests
+from config import (
+    SPARQL_ENDPOINT,
+    SPARQL_USERNAME,
+    SPARQL_PASSWORD,
+    TEST_GRAPH,
+    STORE_CONCURRENCY,
+    STORE_QUEUE_LIMIT,
+    STORE_INTERACTIVE_SLOTS,
+    STORE_TIMEOUT,
+    STORE_SLOW_SECONDS,
+    STORE_BREAKER_WINDOW,
+    STORE_BREAKER_MIN_QUERIES,
+    STORE_BREAKER_FAILURE_RATIO,
+    STORE_BREAKER_COOLDOWN,
+)
 from rdflib import Graph, URIRef
 
+from utils import changes
+from utils.store import BULK, CircuitBreaker, SingleFlightGraph, StoreLimiter
+
 g = None
 prefixes = None
+# identifies the currently loaded data, made from its fingerprint (see changes.py) so that every worker & replica that
+# loads the same data gives the same response validators, or from the time it was loaded if it can't be fingerprinted
+dataset_version = None
+dataset_modified = None
+# the fingerprint of the loaded data, and the version & modification time of each collection's data, changing only when
+# that collection's does
+fingerprint = None
+collection_versions = {}
+# added to every version once a full reload has been asked for, the fingerprint not noticing every edit
+reload_mark = ""
+# set once the data is first loaded and the API can answer requests for it
+ready = threading.Event()
+# a RedisCache for query results shared by the replicas of the API, set by app.py if there is one
+query_cache = None
+# the queries in flight to the store from this process
+store_limiter = StoreLimiter(STORE_CONCURRENCY, STORE_QUEUE_LIMIT, STORE_INTERACTIVE_SLOTS)
+# refuses queries while the store is failing or slow
+store_breaker = CircuitBreaker(
+    window=STORE_BREAKER_WINDOW,
+    min_calls=STORE_BREAKER_MIN_QUERIES,
+    failure_ratio=STORE_BREAKER_FAILURE_RATIO,
+    slow_seconds=STORE_SLOW_SECONDS,
+    cooldown=STORE_BREAKER_COOLDOWN,
+)
+# refuses the queries passed on by /sparql while they are failing or slow, apart from store_breaker, so that expensive
+# queries sent to it can't open the breaker the pages are answered through
+proxy_breaker = CircuitBreaker(
+    window=STORE_BREAKER_WINDOW,
+    min_calls=STORE_BREAKER_MIN_QUERIES,
+    failure_ratio=STORE_BREAKER_FAILURE_RATIO,
+    slow_seconds=STORE_SLOW_SECONDS,
+    cooldown=STORE_BREAKER_COOLDOWN,
+)
 
-def get_graph():
-
+def open_graph():
+    """Opens the store (or loads the TEST_GRAPH), without querying it"""
     global g
-    global prefixes
 
     if TEST_GRAPH:
         with open(TEST_GRAPH, "rb") as handle:
             g = pickle.load(handle)
     else:
-        logging.debug("get_graph() for {}".format(SPARQL_ENDPOINT))
+        logging.debug("open_graph() for {}".format(SPARQL_ENDPOINT))
+        # the SPARQLStore has no timeout of its own, its requests are made on sockets opened with the default one
+        socket.setdefaulttimeout(STORE_TIMEOUT)
         g = Graph("SPARQLStore")
         g.open(SPARQL_ENDPOINT)
 
-    # get the API set of preferred prefixes (rdfs, skos, owl, geo, etc.)
-    static_prefixes = Graph().parse('static/query_prefixes.ttl', format='turtle')
+    # concurrent requests for the same data share one query to the store
+    g = SingleFlightGraph(g, cache=query_cache, limiter=store_limiter, breaker=store_breaker)
+    return g
+
+
+def get_graph():
+
+    global prefixes
+
+    open_graph()
+
+    # the API set of preferred prefixes (rdfs, skos, owl, geo, etc.)
+    prefixes = dict(static_prefixes())
     # add any dataset specific preferred prefixes from the "preferred-prefixes" graph
     sparql_prefixes = """DESCRIBE * {GRAPH <https://preferred-prefixes> {?s ?p ?o}}"""
 
     try:
-        dataset_prefixes = g.query(sparql_prefixes).graph
-        static_prefixes += dataset_prefixes
+        for s, p, o in g.query(sparql_prefixes).graph:
+            prefixes[str(o)] = URIRef(s)
     except Exception as ex:
         logging.info(f"No preferred prefixes found for dataset. {ex}")
 
-    prefixes = {}
-    for s, p, o in static_prefixes:
-        prefixes[str(o)] = URIRef(s)
-        
     return g, prefixes
+
+
+@functools.lru_cache(maxsize=None)
+def static_prefixes() -> dict:
+    """The API's own preferred prefixes, from static/query_prefixes.ttl, parsed once and kept for reloads"""
+    return {str(o): URIRef(s) for s, p, o in Graph().parse("static/query_prefixes.ttl", format="turtle")}
+
+
+def stamp_dataset_version():
+    """Versions the data by the time it was (re)loaded, for data that can't be fingerprinted"""
+    global dataset_version
+    global dataset_modified
+
+    now = datetime.now(timezone.utc)
+    dataset_version = now.strftime("%Y%m%d%H%M%S%f")
+    dataset_modified = now.replace(microsecond=0)
+
+
+def marked(version: str) -> str:
+    return "{}.{}".format(version, reload_mark) if reload_mark else version
+
+
+def version_mark(version: str) -> str:
+    """The mark of the full reload a version was made after, if any"""
+    return version.partition(".")[2]
+
+
+def mark_reload() -> None:
+    """Marks the data as reloaded in full, so that every version changes even if the fingerprint doesn't"""
+    global reload_mark
+
+    reload_mark = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S%f")
+
+
+def fingerprint_data() -> None:
+    """Fingerprints the loaded data and versions it, and every collection, from that, or by time if it can't be"""
+    global fingerprint
+    global collection_versions
+
+    try:
+        current = changes.fingerprint(g.graph)
+    except Exception as e:
+        logging.error(f"Unable to fingerprint the data, reloads will be full reloads. {e}")
+        fingerprint = None
+        collection_versions = {}
+        stamp_dataset_version()
+        return
+    collection_versions = {}
+    version_data(current, set(current.collections))
+
+
+def version_data(current: changes.Fingerprint, changed: Set[str]) -> None:
+    """Takes a new fingerprint of the data, versioning the data and the changed collections from it (and forgetting
+    removed ones)"""
+    global fingerprint
+    global dataset_version
+    global dataset_modified
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    version = marked(current.digest())
+    if version != dataset_version:
+        dataset_version = version
+        dataset_modified = now
+    for identifier in changed:
+        if identifier in current.collections:
+            collection_versions[identifier] = (marked(current.digest(identifier)), now)
+        else:
+            collection_versions.pop(identifier, None)
+    fingerprint = current
+
+
+def dataset_digest() -> Optional[str]:
+    """The digest of the loaded data's fingerprint, for workers to tell if they have loaded the same data"""
+    return fingerprint.digest() if fingerprint is not None else None
+
+
+def adopt_version(version: str, modified: datetime) -> None:
+    """Takes on the version of the data published by another worker, with the mark of any full reload it made"""
+    global dataset_version
+    global dataset_modified
+    global reload_mark
+
+    if fingerprint is not None and version_mark(version) != reload_mark:
+        reload_mark = version_mark(version)
+        for identifier in fingerprint.collections:
+            collection_versions[identifier] = (marked(fingerprint.digest(identifier)), modified)
+    dataset_version = version
+    dataset_modified = modified
+
+
+def version_for(path: str) -> Tuple[str, datetime]:
+    """The version & modification time of the data a response for a path is made from, its collection's if it is for
+    one (or one of its items), otherwise the whole dataset's"""
+    identifier = changes.collection_from_path(path)
+    if identifier is not None:
+        version = collection_versions.get(identifier)
+        if version is not None:
+            return version
+    return dataset_version, dataset_modified
+
+
+def construct_ntriples(query: str) -> Iterator[bytes]:
+    """Runs a CONSTRUCT query, yielding the result as N-Triples lines
+
+    Against the SPARQL endpoint the response is read off the wire line by line so the result is never held in memory,
+    against a TEST_GRAPH the (small) result Graph is serialised instead. Either way the query is a bulk one for the
+    store_limiter, holding its slot until the result is read, and goes through the store_breaker until the result starts
+    coming back (so a slow reader doesn't count as a slow store).
+    """
+    if TEST_GRAPH:
+        with store_limiter.slot(BULK), store_breaker.guard():
+            ntriples = g.graph.query(query).graph.serialize(format="nt", encoding="utf-8")
+        for line in ntriples.splitlines():
+            if line:
+                yield line
+        return
+
+    headers = {
+        "Content-Type": "application/sparql-query",
+        "Accept": "application/n-triples",
+    }
+    if SPARQL_USERNAME is not None and SPARQL_PASSWORD is not None:
+        auth = (SPARQL_USERNAME, SPARQL_PASSWORD)
+    else:
+        auth = None
+
+    with store_limiter.slot(BULK):
+        with store_breaker.guard():
+            r = requests.post(
+                SPARQL_ENDPOINT,
+                auth=auth,
+                data=query.encode("utf-8"),
+                headers=headers,
+                stream=True,
+                timeout=STORE_TIMEOUT,
+            )
+            if r.status_code >= 400:
+                r.close()
+                r.raise_for_status()
+        with r:
+            for line in r.iter_lines(chunk_size=65536):
+                if line:
+                    yield line
+
+
+def result_value(results: List[dict], predicate: URIRef, key: str = "o1"):
+    """Returns the object of a predicate from property query results (rows of ?p1 ?o1), like Graph.value()"""
+    for r in results:
+        if r["p1"] == predicate:
+            return r[key]
+    return None
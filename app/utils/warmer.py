@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+import httpx
+
+from api.conneg import ROUTES
+from utils import utils
+from utils.sparql_queries import collection_identifiers_sparql
+from utils.store import WARM, CircuitBreaker, query_priority
+
+
+class Popularity:
+    """How often each page has been asked for in each Media Type, for CacheWarmer to warm the most asked for
+
+    The counts are halved after each warming, so the ranking follows recent traffic, and only the max_entries most asked
+    for are kept. Given a file, the ranking is kept there too, so that after a restart (a deploy, say) the pages that
+    were popular before it are warmed.
+    """
+
+    def __init__(self, max_entries: int = 10000, file: Optional[str] = None):
+        self.max_entries = max_entries
+        self.file = file
+        self._counts = {}
+        self._lock = threading.Lock()
+        if file is not None:
+            self.load()
+
+    def record(self, url: str, mediatype: str) -> None:
+        key = (url, mediatype)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if len(self._counts) > 2 * self.max_entries:
+                self._counts = dict(self._ranked()[: self.max_entries])
+
+    def _ranked(self) -> list:
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+
+    def top(self, n: int) -> List[Tuple[str, str]]:
+        """The n most asked for (URL, Media Type)s, most first"""
+        with self._lock:
+            return [key for key, _ in self._ranked()[:n]]
+
+    def decay(self) -> None:
+        with self._lock:
+            self._counts = {key: count // 2 for key, count in self._counts.items() if count > 1}
+
+    def load(self) -> None:
+        try:
+            with open(self.file) as f:
+                counts = {(url, mediatype): count for url, mediatype, count in json.load(f)}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.error(f"Unable to read the page popularity ranking {self.file}: {e}")
+            return
+        with self._lock:
+            self._counts = counts
+
+    def save(self) -> None:
+        if self.file is None:
+            return
+        with self._lock:
+            ranking = [[url, mediatype, count] for (url, mediatype), count in self._ranked()[: self.max_entries]]
+        temporary = f"{self.file}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "w") as f:
+                json.dump(ranking, f)
+            os.replace(temporary, self.file)
+        except OSError as e:
+            logging.error(f"Unable to write the page popularity ranking {self.file}: {e}")
+
+
+def offered_mediatypes(path: str, mediatypes: Sequence[str]) -> List[str]:
+    """Those of some Media Types the default profile of an endpoint is offered in"""
+    for pattern, profiles, default_profile_token, _ in ROUTES:
+        if pattern.match(path):
+            return [mediatype for mediatype in mediatypes if mediatype in profiles[default_profile_token].mediatypes]
+    return list(mediatypes)
+
+
+class CacheWarmer:
+    """Renders the pages most likely to be asked for in the background, so that the first requests for them after a
+    (re)load find them, and the data they are made from, in the caches rather than waiting on the store
+
+    Warms the given pages or, by default, the landing page, /collections, every collection and the first items_pages
+    pages of each one's items, in those of mediatypes each is offered in, plus the popular most asked for pages in a
+    Popularity ranking. Runs once the data is first loaded, on every reload (see trigger()) and every interval seconds.
+
+    The pages are requested through the API itself, concurrency of them at a time, their store queries at WARM priority,
+    behind those of every request, and only while the store has a slot free and its circuit breaker is closed, so the
+    warmer never competes with requests for the store.
+    """
+
+    def __init__(
+        self,
+        app,
+        base_url: str,
+        pages: Optional[Sequence[str]] = None,
+        items_pages: int = 1,
+        mediatypes: Sequence[str] = ("text/html", "application/json", "application/geo+json"),
+        popularity: Optional[Popularity] = None,
+        popular: int = 0,
+        interval: float = 3600,
+        concurrency: int = 2,
+        pause: float = 1.0,
+    ):
+        self.app = app
+        self.base_url = base_url.rstrip("/")
+        self.pages = pages
+        self.items_pages = items_pages
+        self.mediatypes = mediatypes
+        self.popularity = popularity
+        self.popular = popular
+        self.interval = interval
+        self.concurrency = max(concurrency, 1)
+        self.pause = pause
+        self._due = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="cache-warmer", daemon=True).start()
+
+    def trigger(self) -> None:
+        """Warms the caches again, the data having been reloaded (once any warming under way has finished)"""
+        self._due.set()
+
+    def _run(self):
+        while True:
+            self._due.clear()
+            try:
+                self.warm()
+            except Exception as e:
+                logging.error(f"Unable to warm the caches: {e}")
+            self._due.wait(self.interval if self.interval > 0 else None)
+
+    def warm(self) -> int:
+        """Warms the caches, returning the number of responses rendered"""
+        start = time.perf_counter()
+        token = query_priority.set(WARM)
+        try:
+            warmed = asyncio.run(self._warm(list(self.targets())))
+        finally:
+            query_priority.reset(token)
+        if self.popularity is not None:
+            self.popularity.save()
+            self.popularity.decay()
+        logging.info(f"Warmed {warmed} responses in {time.perf_counter() - start:.1f} seconds")
+        return warmed
+
+    def targets(self) -> Iterator[Tuple[str, List[str], bool]]:
+        """Yields the URL of each page to warm, with the Media Types to warm it in and whether the following pages of it
+        should be warmed too"""
+        if self.pages is not None:
+            for page in self.pages:
+                yield self.base_url + page, offered_mediatypes(urlsplit(page).path, self.mediatypes), False
+        else:
+            for path in ("/", "/collections"):
+                yield self.base_url + path, offered_mediatypes(path, self.mediatypes), False
+            for r in utils.g.query(collection_identifiers_sparql.substitute()):
+                path = "/collections/" + quote(str(r["identifier"]), safe="")
+                yield self.base_url + path, offered_mediatypes(path, self.mediatypes), False
+                path += "/items"
+                yield self.base_url + path, offered_mediatypes(path, self.mediatypes), self.items_pages > 1
+
+        if self.popularity is not None and self.popular > 0:
+            for url, mediatype in self.popularity.top(self.popular):
+                yield url, [mediatype], False
+
+    def following_pages(self, url: str, response: httpx.Response) -> List[str]:
+        """The URLs of the pages after the first of a paged listing, up to items_pages, from its rel="last" link"""
+        last = response.links.get("last")
+        if last is None:
+            return []
+        params = parse_qs(urlsplit(last["url"]).query)
+        try:
+            last_page = int(params["page"][0])
+            per_page = int(params["per_page"][0])
+        except (KeyError, ValueError):
+            return []
+        return [f"{url}?per_page={per_page}&page={page}" for page in range(2, min(last_page, self.items_pages) + 1)]
+
+    async def _wait_for_store(self):
+        while not (utils.store_limiter.idle() and utils.store_breaker.state == CircuitBreaker.CLOSED):
+            await asyncio.sleep(self.pause)
+
+    async def _warm(self, targets: list) -> int:
+        queue = asyncio.Queue()
+        for target in targets:
+            queue.put_nowait(target)
+        seen = set()
+        warmed = 0
+
+        transport = httpx.ASGITransport(app=self.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, headers={"Accept-Encoding": "identity"}, timeout=None
+        ) as client:
+
+            async def warm_pages():
+                nonlocal warmed
+                while not queue.empty():
+                    url, mediatypes, paged = queue.get_nowait()
+                    for mediatype in mediatypes:
+                        if (url, mediatype) in seen:
+                            continue
+                        seen.add((url, mediatype))
+                        await self._wait_for_store()
+                        r = await client.get(url, headers={"Accept": mediatype})
+                        if r.status_code != 200:
+                            logging.warning(f"Unable to warm {url} as {mediatype}: {r.status_code}")
+                            continue
+                        warmed += 1
+                        if paged:
+                            paged = False
+                            for page_url in self.following_pages(url, r):
+                                queue.put_nowait((page_url, mediatypes, False))
+
+            await asyncio.gather(*(warm_pages() for _ in range(self.concurrency)))
+        return warmed
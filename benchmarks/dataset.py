@@ -0,0 +1,329 @@
+"""Generates synthetic datasets, of the shape the API expects, for benchmarking and scale testing
+
+A dcat:Dataset with N geo:FeatureCollections of M geo:Features each, every Feature having a random (but simple) polygon
+of a given number of vertices somewhere over Australia, as a WKT literal and as the TB16Pix cells its vertices fall in,
+plus the labels and conformance targets the API queries for and a <https://preferred-prefixes> graph.
+
+Triples are generated one at a time, so datasets of any size (10^3 to 10^8 triples) can be streamed to N-Triples or
+N-Quads files without being held in memory. Small datasets can instead be written as a pickled Graph, for the
+TEST_GRAPH environment variable (which can't hold the preferred prefixes graph, rdflib doesn't support the DESCRIBE
+query it is read with).
+
+Given --truth, the features a fixed set of bbox queries should return are written to a JSON file along with the
+dataset: for each WGS84 bbox the features whose polygons intersect it, and for each TB16Pix cell the features with a cell
+within it. Everything is generated from --seed, so the same arguments always give the same dataset and ground truth.
+
+Run from the repository root:
+
+    python benchmarks/dataset.py --collections 10 --triples 1000000 --output /tmp/benchmark.nt --truth /tmp/truth.json
+"""
+import argparse
+import math
+import pickle
+import random
+import sys
+from typing import IO, Iterator, List, Tuple
+
+import orjson
+from rdflib import BNode, Graph, Literal, Namespace, URIRef
+from rdflib.namespace import DCAT, DCTERMS, RDF, RDFS, XSD
+
+GEO = Namespace("http://www.opengis.net/ont/geosparql#")
+GEOX = Namespace("https://linked.data.gov.au/def/geox#")
+OGCAPI = Namespace("https://data.surroundaustralia.com/def/ogcldapi/")
+BASE = "https://example.com/benchmark/"
+PREFERRED_PREFIXES = URIRef("https://preferred-prefixes")
+PREFERRED_PREFIX = URIRef("https://preferredPrefix")
+
+CONFORMANCE_TARGETS = {
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/core": "Core",
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/oas30": "OpenAPI 3.0",
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/html": "HTML",
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/geojson": "GeoJSON",
+}
+
+# features are placed within this (lon, lat) extent
+EXTENT = (113.0, -44.0, 154.0, -10.0)
+# the triples each feature has, see feature_triples()
+TRIPLES_PER_FEATURE = 8
+# the resolution of the TB16Pix cells given for each feature
+DGGS_RESOLUTION = 6
+# latitude of the edges of the polar root cells
+POLAR_LATITUDE = math.degrees(math.asin(2 / 3))
+
+Triple = Tuple[URIRef, URIRef, object]
+Polygon = List[Tuple[float, float]]
+
+
+def cell_id(lon: float, lat: float, resolution: int) -> str:
+    """The TB16Pix cell of a resolution a point falls in
+
+    The root cell is N or S above or below the polar caps, otherwise O, P, Q or R by longitude quadrant, as in rHEALPix.
+    Each cell is then split 3 x 3, numbered 0 - 8 from its north west corner. The split is equirectangular rather than
+    of the rHEALPix projection, so cells aren't equal area, but IDs are valid and nest as real cells do.
+    """
+    if lat > POLAR_LATITUDE:
+        suid, (west, south, east, north) = "N", (-180.0, POLAR_LATITUDE, 180.0, 90.0)
+    elif lat < -POLAR_LATITUDE:
+        suid, (west, south, east, north) = "S", (-180.0, -90.0, 180.0, -POLAR_LATITUDE)
+    else:
+        quadrant = min(int((lon + 180) // 90), 3)
+        suid = "OPQR"[quadrant]
+        west, south, east, north = -180.0 + 90 * quadrant, -POLAR_LATITUDE, -90.0 + 90 * quadrant, POLAR_LATITUDE
+
+    # the column and row of the cell among the root cell's 3^resolution x 3^resolution, read off as base 3 digits
+    cells = 3 ** resolution
+    column = min(int((lon - west) / (east - west) * cells), cells - 1)
+    row = min(int((north - lat) / (north - south) * cells), cells - 1)
+    digits = []
+    for _ in range(resolution):
+        digits.append(str(row % 3 * 3 + column % 3))
+        column //= 3
+        row //= 3
+    return suid + "".join(reversed(digits))
+
+
+def random_polygon(rng: random.Random, vertices: int) -> Polygon:
+    """A star shaped, so simple, polygon of a number of vertices (at least 3), closed"""
+    vertices = max(vertices, 3)
+    x = rng.uniform(EXTENT[0] + 1, EXTENT[2] - 1)
+    y = rng.uniform(EXTENT[1] + 1, EXTENT[3] - 1)
+    size = rng.uniform(0.005, 0.2)
+    points = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        radius = size * rng.uniform(0.5, 1.0)
+        points.append((round(x + radius * math.cos(angle), 6), round(y + radius * math.sin(angle), 6)))
+    points.append(points[0])
+    return points
+
+
+def polygon_wkt(polygon: Polygon) -> str:
+    return "POLYGON (({}))".format(", ".join("{} {}".format(x, y) for x, y in polygon))
+
+
+def polygon_cells(polygon: Polygon) -> List[str]:
+    return sorted(set(cell_id(x, y, DGGS_RESOLUTION) for x, y in polygon))
+
+
+def dggs_literal(cells: List[str]) -> str:
+    return "<https://w3id.org/dggs/tb16pix> POLYGON ({})".format(" ".join(cells))
+
+
+def intersects(polygon: Polygon, bbox: Tuple[float, float, float, float]) -> bool:
+    """Whether a (closed) polygon and a (west, south, east, north) bbox intersect"""
+    west, south, east, north = bbox
+    xs = [x for x, y in polygon]
+    ys = [y for x, y in polygon]
+    if max(xs) < west or min(xs) > east or max(ys) < south or min(ys) > north:
+        return False
+
+    # a vertex in the bbox
+    if any(west <= x <= east and south <= y <= north for x, y in polygon):
+        return True
+
+    # the bbox in the polygon
+    inside = False
+    cx, cy = west, south
+    for (x1, y1), (x2, y2) in zip(polygon, polygon[1:]):
+        if (y1 > cy) != (y2 > cy) and cx < x1 + (cy - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    if inside:
+        return True
+
+    # an edge crossing the bbox, checked by clipping each edge to it
+    for (x1, y1), (x2, y2) in zip(polygon, polygon[1:]):
+        t0, t1 = 0.0, 1.0
+        dx, dy = x2 - x1, y2 - y1
+        for p, q in ((-dx, x1 - west), (dx, east - x1), (-dy, y1 - south), (dy, north - y1)):
+            if p == 0:
+                if q < 0:
+                    break
+            else:
+                t = q / p
+                if p < 0:
+                    t0 = max(t0, t)
+                else:
+                    t1 = min(t1, t)
+        else:
+            if t0 <= t1:
+                return True
+    return False
+
+
+def metadata_triples() -> Iterator[Triple]:
+    dataset = URIRef(BASE + "dataset")
+    yield dataset, RDF.type, DCAT.Dataset
+    yield dataset, RDFS.label, Literal("Benchmark Dataset")
+    yield dataset, DCTERMS.description, Literal("A synthetic dataset for benchmarking the API")
+    yield dataset, DCTERMS.creator, URIRef(BASE + "org")
+    yield URIRef(BASE + "org"), RDFS.label, Literal("Benchmark Organisation")
+
+    for uri, label in CONFORMANCE_TARGETS.items():
+        yield URIRef(uri), RDF.type, OGCAPI.ConformanceTarget
+        yield URIRef(uri), RDFS.label, Literal(label)
+
+    for p, label in [
+        (DCTERMS.identifier, "identifier"),
+        (DCTERMS.isPartOf, "is part of"),
+        (GEO.hasGeometry, "has geometry"),
+        (GEO.asWKT, "as WKT"),
+        (GEOX.asDGGS, "as DGGS"),
+        (GEO.Feature, "Feature"),
+        (GEO.FeatureCollection, "Feature Collection"),
+        (GEO.Geometry, "Geometry"),
+    ]:
+        yield p, RDFS.label, Literal(label, lang="en")
+
+
+def prefix_triples() -> Iterator[Triple]:
+    """The triples of the <https://preferred-prefixes> graph"""
+    yield URIRef(BASE), PREFERRED_PREFIX, Literal("bench")
+    yield URIRef(str(GEOX)), PREFERRED_PREFIX, Literal("geox")
+    yield URIRef(str(OGCAPI)), PREFERRED_PREFIX, Literal("ogcapi")
+
+
+def collection_triples(c: int) -> Iterator[Triple]:
+    collection = URIRef(BASE + "collection/{}".format(c))
+    yield collection, RDF.type, GEO.FeatureCollection
+    yield collection, DCTERMS.identifier, Literal("c{}".format(c), datatype=XSD.token)
+    yield collection, RDFS.label, Literal("Collection {}".format(c))
+    yield collection, DCTERMS.description, Literal("Synthetic collection {}".format(c))
+    yield collection, DCTERMS.isPartOf, URIRef(BASE + "dataset")
+
+
+def feature_triples(c: int, f: int, polygon: Polygon, cells: List[str]) -> Iterator[Triple]:
+    feature = URIRef(BASE + "feature/{}/{}".format(c, f))
+    geometry = BNode("c{}f{}g".format(c, f))
+    yield feature, RDF.type, GEO.Feature
+    yield feature, DCTERMS.identifier, Literal("f{}".format(f), datatype=XSD.token)
+    yield feature, RDFS.label, Literal("Feature {}.{}".format(c, f))
+    yield feature, DCTERMS.isPartOf, URIRef(BASE + "collection/{}".format(c))
+    yield feature, GEO.hasGeometry, geometry
+    yield geometry, RDF.type, GEO.Geometry
+    yield geometry, GEO.asWKT, Literal(polygon_wkt(polygon), datatype=GEO.wktLiteral)
+    yield geometry, GEOX.asDGGS, Literal(dggs_literal(cells), datatype=GEOX.dggsLiteral)
+
+
+class GroundTruth:
+    """A fixed set of bbox queries, and the features each should return as they are generated"""
+
+    def __init__(self, rng: random.Random, queries: int = 10):
+        self.bboxes = []
+        for _ in range(queries):
+            west = rng.uniform(EXTENT[0], EXTENT[2] - 5)
+            south = rng.uniform(EXTENT[1], EXTENT[3] - 5)
+            size = rng.uniform(0.5, 5)
+            self.bboxes.append((round(west, 6), round(south, 6), round(west + size, 6), round(south + size, 6)))
+        self.cells = [
+            cell_id(rng.uniform(EXTENT[0], EXTENT[2]), rng.uniform(EXTENT[1], EXTENT[3]), rng.randint(2, 4))
+            for _ in range(queries)
+        ]
+        self.bbox_features = {bbox: [] for bbox in self.bboxes}
+        self.cell_features = {cell: [] for cell in self.cells}
+
+    def add(self, c: int, f: int, polygon: Polygon, cells: List[str]) -> None:
+        key = ("c{}".format(c), "f{}".format(f))
+        for bbox, features in self.bbox_features.items():
+            if intersects(polygon, bbox):
+                features.append(key)
+        for query_cell, features in self.cell_features.items():
+            if any(cell.startswith(query_cell) for cell in cells):
+                features.append(key)
+
+    def to_dict(self) -> dict:
+        return {
+            "bbox": [
+                {"bbox": ",".join(str(x) for x in bbox), "features": features}
+                for bbox, features in self.bbox_features.items()
+            ],
+            "dggs": [{"bbox": cell, "features": features} for cell, features in self.cell_features.items()],
+        }
+
+
+def triples(
+    collections: int, features: int, vertices: int, seed: int = 0, truth: GroundTruth = None
+) -> Iterator[Triple]:
+    """The dataset's triples (not the preferred prefixes graph's), adding each feature to the ground truth if given"""
+    rng = random.Random(seed)
+    yield from metadata_triples()
+    for c in range(collections):
+        yield from collection_triples(c)
+        for f in range(features):
+            polygon = random_polygon(rng, vertices)
+            cells = polygon_cells(polygon)
+            if truth is not None:
+                truth.add(c, f, polygon, cells)
+            yield from feature_triples(c, f, polygon, cells)
+
+
+def make_graph(collections: int, features: int, vertices: int, seed: int = 0) -> Graph:
+    g = Graph()
+    g.bind("geo", GEO)
+    g.bind("geox", GEOX)
+    for triple in triples(collections, features, vertices, seed):
+        g.add(triple)
+    return g
+
+
+def write_lines(output: IO[bytes], collections: int, features: int, vertices: int, seed: int, quads: bool,
+                truth: GroundTruth = None) -> int:
+    """Streams the dataset as N-Triples, or N-Quads with the preferred prefixes graph, returning the number written"""
+    count = 0
+    for s, p, o in triples(collections, features, vertices, seed, truth):
+        output.write("{} {} {} .\n".format(s.n3(), p.n3(), o.n3()).encode("utf-8"))
+        count += 1
+    if quads:
+        for s, p, o in prefix_triples():
+            output.write("{} {} {} {} .\n".format(s.n3(), p.n3(), o.n3(), PREFERRED_PREFIXES.n3()).encode("utf-8"))
+            count += 1
+    return count
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--collections", type=int, default=5, help="number of feature collections")
+    parser.add_argument("--features", type=int, default=200, help="number of features per collection")
+    parser.add_argument("--vertices", type=int, default=32, help="number of vertices of each feature's polygon")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random geometries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument(
+        "--triples", type=int, help="approximate number of triples to generate, instead of giving --features"
+    )
+    parser.add_argument("--format", choices=["nt", "nq", "pickle"], default="nt")
+    parser.add_argument("--output", default="-", help="file to write the dataset to, - for stdout (not for pickle)")
+    parser.add_argument("--truth", help="file to write the ground truth of the bbox queries to")
+    args = parser.parse_args()
+
+    if args.triples is not None:
+        args.features = max(1, args.triples // (args.collections * TRIPLES_PER_FEATURE))
+    truth = GroundTruth(random.Random(args.seed + 1)) if args.truth else None
+
+    if args.format == "pickle":
+        g = Graph()
+        g.bind("geo", GEO)
+        g.bind("geox", GEOX)
+        for triple in triples(args.collections, args.features, args.vertices, args.seed, truth):
+            g.add(triple)
+        with open(args.output, "wb") as f:
+            pickle.dump(g, f)
+        count = len(g)
+    elif args.output == "-":
+        count = write_lines(
+            sys.stdout.buffer, args.collections, args.features, args.vertices, args.seed, args.format == "nq", truth
+        )
+    else:
+        with open(args.output, "wb") as f:
+            count = write_lines(f, args.collections, args.features, args.vertices, args.seed, args.format == "nq", truth)
+
+    if truth is not None:
+        with open(args.truth, "wb") as f:
+            f.write(orjson.dumps(truth.to_dict(), option=orjson.OPT_INDENT_2))
+    print(f"{count} triples, {args.collections} collections of {args.features} features", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
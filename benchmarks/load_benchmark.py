@@ -0,0 +1,190 @@
+"""Load benchmark of the API against a synthetic dataset
+
+Generates a dataset (see dataset.py), loads the API from app/app.py over it and drives a load profile across the
+landing page, collections, items, single items and the SPARQL endpoint, reporting latency percentiles and throughput per
+endpoint. The store is either the pickled Graph loaded through TEST_GRAPH ("pickle", the default) or a local stand-in
+SPARQL endpoint serving the same Graph over HTTP ("sparql", see sparql_standin.py), which the SPARQL endpoint's queries
+are always passed on to. Give --redis to also put the API's Redis cache tier in front of the store, on a local stand-in
+server (see redis_standin.py).
+
+Run from the repository root:
+
+    python benchmarks/load_benchmark.py --collections 5 --features 200 --vertices 32 --requests 500 --concurrency 20
+
+Give --json to also write the results, with the commit they were measured at, to a file for comparing across commits.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+import httpx
+import orjson
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "app")
+
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from dataset import add_arguments, make_graph  # noqa: E402
+from redis_standin import serve as serve_redis  # noqa: E402
+from sparql_standin import serve  # noqa: E402
+
+SPARQL_QUERY = """
+    PREFIX geo: <http://www.opengis.net/ont/geosparql#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    SELECT ?f ?label WHERE { ?f a geo:Feature ; rdfs:label ?label } LIMIT 20
+    """
+
+
+def load_api(g, store: str, redis: bool = False):
+    """Imports the API, configured to use a Graph as its store, as app.py does when run under uvicorn"""
+    standin, endpoint = serve(g)
+    os.environ["SPARQL_ENDPOINT"] = endpoint
+    if redis:
+        redis_standin, os.environ["REDIS_URL"] = serve_redis()
+    if store == "pickle":
+        handle, path = tempfile.mkstemp(suffix=".pickle")
+        with os.fdopen(handle, "wb") as f:
+            pickle.dump(g, f)
+        os.environ["TEST_GRAPH"] = path
+    else:
+        os.environ.pop("TEST_GRAPH", None)
+
+    # app.py reads static files relative to the working directory
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    # httpx doesn't run the startup event, which would load the data in the background
+    app.load_data()
+
+    if store == "pickle":
+        os.remove(path)
+
+    # log records are created and dispatched as in production, but not written anywhere
+    root = logging.getLogger()
+    root.handlers = [logging.NullHandler()]
+    root.setLevel(logging.INFO)
+
+    return app.api
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted latencies"""
+    return latencies[max(0, min(len(latencies) - 1, int(round(p / 100 * len(latencies))) - 1))]
+
+
+async def run(client: httpx.AsyncClient, request: Callable, requests: int, concurrency: int) -> dict:
+    # warm up
+    for i in range(min(20, requests)):
+        (await request(client, i)).raise_for_status()
+
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for i in remaining:
+            start = time.perf_counter()
+            (await request(client, i)).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "req_s": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def load_profile(collections: int, features: int) -> dict:
+    """The requests made of each endpoint, the i-th request of each being made by calling its function with i"""
+    rng = random.Random(0)
+    items = [
+        "/collections/c{}/items/f{}".format(rng.randrange(collections), rng.randrange(features)) for _ in range(1000)
+    ]
+
+    return {
+        "/": lambda client, i: client.get("/"),
+        "/collections": lambda client, i: client.get("/collections"),
+        "/items": lambda client, i: client.get("/collections/c{}/items".format(i % collections)),
+        "/items/{id}": lambda client, i: client.get(items[i % len(items)]),
+        "/sparql": lambda client, i: client.post(
+            "/sparql",
+            data={"query": SPARQL_QUERY},
+            headers={"Accept": "application/sparql-results+json"},
+        ),
+    }
+
+
+async def run_all(api, profile: dict, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        results = {}
+        for name, request in profile.items():
+            results[name] = await run(client, request, requests, concurrency)
+            r = results[name]
+            print(
+                f"{name:14} {r['req_s']:9.1f} req/s   "
+                f"p50 {r['p50_ms']:8.1f} ms   p95 {r['p95_ms']:8.1f} ms   p99 {r['p99_ms']:8.1f} ms"
+            )
+        return results
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--store", choices=["pickle", "sparql"], default="pickle")
+    parser.add_argument("--redis", action="store_true", help="cache in a stand-in Redis server")
+    parser.add_argument("--requests", type=int, default=500, help="number of requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--json", help="file to write the results to")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    g = make_graph(args.collections, args.features, args.vertices)
+    print(
+        f"{len(g)} triples, {args.collections} collections of {args.features} features, store: {args.store}"
+        + (" behind redis" if args.redis else "")
+    )
+    api = load_api(g, args.store, args.redis)
+
+    results = asyncio.run(
+        run_all(api, load_profile(args.collections, args.features), args.requests, args.concurrency)
+    )
+
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {"commit": current_commit(), "arguments": vars(args), "results": results},
+                    option=orjson.OPT_INDENT_2,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
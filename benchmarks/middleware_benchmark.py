@@ -0,0 +1,120 @@
+"""Load benchmark of the API's per-request middleware stack
+
+Compares the CorrelationId + Logging middlewares as they were (Starlette BaseHTTPMiddleware subclasses) with the pure
+ASGI ones now in app/middlewares, in front of a trivial app so only the middleware overhead is measured.
+
+Run from the repository root:
+
+    python benchmarks/middleware_benchmark.py --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, StreamingResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from middlewares.correlation_id_middleware import CorrelationIdMiddleware  # noqa: E402
+from middlewares.logging_middleware import LoggingMiddleware  # noqa: E402
+
+
+class LegacyCorrelationIdMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        correlation_id = request.headers.get("x-correlation-id") or str(uuid.uuid4())
+        request.state.correlation_id = correlation_id
+        response = await call_next(request)
+        response.headers["x-correlation-id"] = correlation_id
+        return response
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        logger = logging.getLogger()
+        logger.info(
+            "Request",
+            extra={
+                "uuid": request.state.correlation_id,
+                "type": "api-request",
+                "method": str(request.method).upper(),
+                "url": str(request.url),
+            },
+        )
+        response = await call_next(request)
+        logger.info(
+            "Response sent",
+            extra={
+                "uuid": request.state.correlation_id,
+                "type": "api-response",
+                "code": response.status_code,
+            },
+        )
+        return response
+
+
+def make_app(correlation_id_middleware, logging_middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    def index():
+        return PlainTextResponse("x" * 2048)
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"x" * 1024 for _ in range(64)), media_type="text/plain")
+
+    # same order as app.py, the last added runs first
+    app.add_middleware(logging_middleware)
+    app.add_middleware(correlation_id_middleware)
+    return app
+
+
+async def run(app, path: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        # warm up
+        for _ in range(50):
+            (await client.get(path)).raise_for_status()
+
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                (await client.get(path)).raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    # log records are created and dispatched as in production, but not written anywhere
+    root = logging.getLogger()
+    root.handlers = [logging.NullHandler()]
+    root.setLevel(logging.INFO)
+
+    stacks = {
+        "BaseHTTPMiddleware": make_app(LegacyCorrelationIdMiddleware, LegacyLoggingMiddleware),
+        "pure ASGI": make_app(CorrelationIdMiddleware, LoggingMiddleware),
+    }
+    for path in ["/", "/stream"]:
+        for name, app in stacks.items():
+            rate = asyncio.run(run(app, path, args.requests, args.concurrency))
+            print(f"{path:8} {name:20} {rate:9.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
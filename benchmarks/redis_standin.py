@@ -0,0 +1,102 @@
+"""A local stand-in for a Redis server, holding values in memory
+
+Implements just enough of the Redis protocol (RESP) for the API's RedisCache: PING, AUTH, SELECT, GET, SET (with EX and
+NX), DEL, DBSIZE and FLUSHALL, with expiry. Used by load_benchmark.py (--redis) to measure the API with its Redis tier,
+and to check how that tier behaves, e.g. when the server goes away (stop() the server), without a Redis to hand.
+"""
+import socketserver
+import threading
+import time
+from typing import Tuple
+
+
+class RedisStandin(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int]):
+        super().__init__(address, RedisHandler)
+        self.values = {}
+        self.expiries = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+        self.stopped = False
+
+    def lookup(self, key: bytes):
+        expiry = self.expiries.get(key)
+        if expiry is not None and expiry <= time.monotonic():
+            self.values.pop(key, None)
+            self.expiries.pop(key, None)
+        return self.values.get(key)
+
+    def execute(self, args: list) -> bytes:
+        name = args[0].upper()
+        with self.lock:
+            self.commands += 1
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name in (b"AUTH", b"SELECT"):
+                return b"+OK\r\n"
+            if name == b"GET":
+                return bulk(self.lookup(args[1]))
+            if name == b"SET":
+                key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+                if b"NX" in options and self.lookup(key) is not None:
+                    return b"$-1\r\n"
+                self.values[key] = value
+                self.expiries.pop(key, None)
+                if b"EX" in options:
+                    self.expiries[key] = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+                return b"+OK\r\n"
+            if name == b"DEL":
+                deleted = sum(self.values.pop(key, None) is not None for key in args[1:])
+                return b":%d\r\n" % deleted
+            if name == b"DBSIZE":
+                return b":%d\r\n" % len(self.values)
+            if name == b"FLUSHALL":
+                self.values.clear()
+                self.expiries.clear()
+                return b"+OK\r\n"
+        return b"-ERR unknown command '" + args[0] + b"'\r\n"
+
+    def stop(self):
+        """Stops the server, dropping the connections to it"""
+        self.stopped = True
+        self.shutdown()
+        self.server_close()
+
+
+def bulk(value) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = read_command(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if args is None or self.server.stopped:
+                return
+            self.wfile.write(self.server.execute(args))
+
+
+def read_command(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        raise ValueError("Only RESP arrays are supported")
+    args = []
+    for _ in range(int(line[1:])):
+        length = int(rfile.readline()[1:])
+        args.append(rfile.read(length + 2)[:-2])
+    return args
+
+
+def serve(host: str = "127.0.0.1", port: int = 0) -> Tuple[RedisStandin, str]:
+    """Starts a stand-in server in a background thread, returning the server and its URL"""
+    server = RedisStandin((host, port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "redis://{}:{}/0".format(*server.server_address)
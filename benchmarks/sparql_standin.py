@@ -0,0 +1,84 @@
+"""A local stand-in for the SPARQL endpoint the API is deployed against, answering queries from an in-memory Graph
+
+Implements just enough of the SPARQL 1.1 Protocol for the API and its rdflib SPARQLStore: queries by GET or by POST
+(direct or URL-encoded), SELECT/ASK results as SPARQL XML or JSON and CONSTRUCT/DESCRIBE results as RDF/XML, Turtle or
+N-Triples according to the Accept header. Used by load_benchmark.py so the store's HTTP round trips are part of what is
+measured, without a Fuseki to hand.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+
+from rdflib import Graph
+
+RDF_FORMATS = [
+    ("application/n-triples", "nt"),
+    ("text/turtle", "turtle"),
+    ("application/ld+json", "json-ld"),
+    ("application/rdf+xml", "xml"),
+]
+
+
+def make_handler(graph: Graph):
+    # rdflib's SPARQL parser isn't thread safe, so the requests take turns at the Graph
+    lock = threading.Lock()
+
+    class SparqlHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query).get("query", [None])[0]
+            self.answer(query)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                query = parse_qs(body).get("query", [None])[0]
+            else:
+                query = body
+            self.answer(query)
+
+        def answer(self, query: str):
+            if not query:
+                self.reply(400, "text/plain", b"No query given")
+                return
+            try:
+                with lock:
+                    result = graph.query(query)
+                    if result.type == "SELECT":
+                        result.bindings
+            except Exception as e:
+                self.reply(400, "text/plain", str(e).encode("utf-8"))
+                return
+
+            accept = self.headers.get("Accept", "")
+            if result.type in ("CONSTRUCT", "DESCRIBE"):
+                media_type, rdf_format = next(
+                    ((m, f) for m, f in RDF_FORMATS if m in accept), RDF_FORMATS[-1]
+                )
+                self.reply(200, media_type, result.graph.serialize(format=rdf_format, encoding="utf-8"))
+            elif "application/sparql-results+json" in accept or "application/json" in accept:
+                self.reply(200, "application/sparql-results+json", result.serialize(format="json"))
+            else:
+                self.reply(200, "application/sparql-results+xml", result.serialize(format="xml"))
+
+        def reply(self, status: int, media_type: str, body: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", media_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return SparqlHandler
+
+
+def serve(graph: Graph, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Starts a stand-in endpoint for a Graph in a background thread, returning the server and its endpoint URL"""
+    server = ThreadingHTTPServer((host, port), make_handler(graph))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://{}:{}/sparql".format(*server.server_address)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the API is run from app/ with top-level imports, and the Redis stand-in is in benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
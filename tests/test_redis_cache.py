@@ -0,0 +1,153 @@
+"""
+Tests the Redis cache tier (app/utils/redis_cache.py) and the query results it holds (app/utils/store.py), against the
+local stand-in server in benchmarks/redis_standin.py, so no Redis is needed.
+"""
+import time
+from datetime import datetime, timezone
+
+import pytest
+from rdflib import BNode, Graph, Literal, Namespace
+from rdflib.compare import isomorphic
+
+from redis_standin import serve
+from utils.redis_cache import RedisCache, TieredCache
+from utils.shared_cache import SharedCache
+from utils.store import SingleFlightGraph, dump_result, load_result
+
+EX = Namespace("http://example.com/")
+MODIFIED = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def server():
+    server, url = serve()
+    yield server, url
+    if not server.stopped:
+        server.stop()
+
+
+@pytest.fixture
+def graph():
+    g = Graph()
+    g.add((EX.a, EX.name, Literal("a")))
+    g.add((EX.b, EX.name, Literal("b")))
+    shape = BNode()
+    g.add((EX.a, EX.shape, shape))
+    g.add((shape, EX.wkt, Literal("POINT (1 2)")))
+    return g
+
+
+def test_get_set(server):
+    cache = RedisCache(server[1])
+    assert cache.get("key") is None
+    cache.set("key", 200, [["content-type", "text/html"]], b"<html/>")
+    assert cache.get("key") == (200, [["content-type", "text/html"]], b"<html/>")
+
+
+def test_fails_open_then_retries(server):
+    standin, url = server
+    cache = RedisCache(url, timeout=0.5, retry_seconds=0.5)
+    cache.set("key", 200, [], b"body")
+    assert cache.get("key") is not None
+
+    # the server goes away: misses and dropped sets, not errors
+    standin.stop()
+    assert cache.get("key") is None
+    cache.set("key", 200, [], b"body")
+
+    # a server back on the same address isn't tried until retry_seconds have passed
+    standin, _ = serve(port=int(url.split(":")[2].split("/")[0]))
+    try:
+        assert cache.get("key") is None
+        assert standin.commands == 0
+        time.sleep(0.6)
+        cache.set("key", 200, [], b"again")
+        assert cache.get("key") == (200, [], b"again")
+    finally:
+        standin.stop()
+
+
+def test_oversized_entries_not_stored(server):
+    cache = RedisCache(server[1], max_entry_bytes=10)
+    cache.set("key", 200, [], b"x" * 11)
+    assert cache.get("key") is None
+    assert server[0].values == {}
+
+
+def test_join_and_publish_version(server):
+    replica1, replica2 = RedisCache(server[1]), RedisCache(server[1])
+    assert replica1.read_version() is None
+
+    # the first replica up publishes its version, the next joins it if it has loaded the same data
+    assert replica1.join_version("v1", MODIFIED, "digest1") == ("v1", MODIFIED)
+    assert replica2.join_version("v1.other", datetime.now(timezone.utc), "digest1") == ("v1", MODIFIED)
+
+    # a reload publishes a new version for all of them
+    later = datetime(2026, 2, 1, tzinfo=timezone.utc)
+    replica2.publish_version("v2", later, "digest2")
+    assert replica1.read_version() == ("v2", later)
+
+    # a replica starting on other data publishes its own version rather than joining
+    assert replica1.join_version("v3", MODIFIED, "digest3") == ("v3", MODIFIED)
+    assert replica2.read_version() == ("v3", MODIFIED)
+
+
+def test_query_results_namespaced_by_version(server, graph):
+    query = "SELECT ?s ?name WHERE { ?s <http://example.com/name> ?name } ORDER BY ?name"
+    replica1 = SingleFlightGraph(graph, cache=RedisCache(server[1]))
+    replica1.version = "v1"
+    expected = [dict(row) for row in replica1.query(query).bindings]
+    assert len(expected) == 2
+
+    # another replica on the same version is given the result rather than querying its store (empty here)
+    replica2 = SingleFlightGraph(Graph(), cache=RedisCache(server[1]))
+    replica2.version = "v1"
+    assert [dict(row) for row in replica2.query(query).bindings] == expected
+
+    # on another version it isn't
+    replica2.version = "v2"
+    assert list(replica2.query(query)) == []
+
+
+def test_select_round_trip(graph):
+    result = graph.query("SELECT ?s ?name WHERE { ?s <http://example.com/name> ?name } ORDER BY ?name")
+    loaded = load_result(dump_result(result))
+    assert loaded.type == "SELECT"
+    assert [dict(row) for row in loaded.bindings] == [dict(row) for row in result.bindings]
+
+
+def test_ask_round_trip(graph):
+    for query, answer in (
+        ("ASK { ?s <http://example.com/name> 'a' }", True),
+        ("ASK { ?s <http://example.com/name> 'c' }", False),
+    ):
+        loaded = load_result(dump_result(graph.query(query)))
+        assert loaded.type == "ASK"
+        assert loaded.askAnswer is answer
+
+
+def test_construct_round_trip(graph):
+    result = graph.query("CONSTRUCT { ?s ?p ?o } WHERE { ?s ?p ?o }")
+    loaded = load_result(dump_result(result))
+    assert loaded.type == "CONSTRUCT"
+    assert isomorphic(loaded.graph, graph)
+
+
+def test_tiered_cache_promotes_hits(server, tmp_path):
+    shared = SharedCache(str(tmp_path), 1024 * 1024, 64 * 1024)
+    redis = RedisCache(server[1])
+    tiered = TieredCache(shared, redis)
+
+    # rendered by another replica, so only in its Redis tier
+    redis.set("key", 200, [["etag", 'W/"1"']], b"body")
+    assert shared.get("key") is None
+    assert tiered.get("key") == (200, [["etag", 'W/"1"']], b"body")
+
+    # a hit in the later tier is copied into the earlier one, so is served from there next time
+    assert shared.get("key") == (200, [["etag", 'W/"1"']], b"body")
+    commands = server[0].commands
+    assert tiered.get("key") is not None
+    assert server[0].commands == commands
+
+    tiered.set("other", 404, [], b"missing")
+    assert shared.get("other") == redis.get("other") == (404, [], b"missing")